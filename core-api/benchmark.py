@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Offline micro-benchmarks for the stages of the detection pipeline in main.py (no HTTP involved).
+
+Each stage is repeated until the 95% confidence interval of its mean is within --target-ci
+of the mean (or --max-repeats is reached), with garbage collection paused while timing.
+
+    python benchmark.py --sizes 640,1920,4032 --detections 0,10,100,500 -o bench.json
+"""
+
+import argparse
+import gc
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# main loads the meanings at import; the model is loaded below, the same way the API loads it
+import main
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+DEFAULT_DATASET = Path(__file__).resolve().parent.parent / "Dataset"
+STAGES = ("decode", "inference_cold", "inference_warm", "postprocess", "crop_encode", "meaning_lookup")
+
+def summarize(samples_ms):
+    """Mean, spread and percentiles of a list of millisecond timings"""
+    ordered = sorted(samples_ms)
+    mean = statistics.fmean(ordered)
+    stdev = statistics.stdev(ordered) if len(ordered) > 1 else 0.0
+    ci95 = 1.96 * stdev / math.sqrt(len(ordered)) if len(ordered) > 1 else 0.0
+    return {
+        "n": len(ordered),
+        "mean_ms": mean,
+        "stdev_ms": stdev,
+        "ci95_ms": ci95,
+        "relative_ci95": ci95 / mean if mean else 0.0,
+        "median_ms": statistics.median(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "min_ms": ordered[0],
+        "max_ms": ordered[-1],
+    }
+
+def measure(fn, setup=None, warmup=3, min_repeats=10, max_repeats=200, target_ci=0.05, time_budget=30.0):
+    """Time fn() until the mean is stable; setup() runs untimed before every call"""
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        fn()
+
+    samples = []
+    deadline = time.perf_counter() + time_budget
+    gc_was_enabled = gc.isenabled()
+    try:
+        while len(samples) < max_repeats:
+            if setup is not None:
+                setup()
+            gc.disable()
+            started = time.perf_counter_ns()
+            fn()
+            samples.append((time.perf_counter_ns() - started) / 1e6)
+            if gc_was_enabled:
+                gc.enable()
+            if len(samples) >= min_repeats:
+                if summarize(samples)["relative_ci95"] <= target_ci or time.perf_counter() > deadline:
+                    break
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return summarize(samples)
+
+def source_image(dataset_dir):
+    """First dataset image, or a synthetic textured image if the dataset is empty"""
+    for path in sorted(Path(dataset_dir).rglob("*")):
+        if path.suffix.lower() in IMAGE_EXTENSIONS:
+            image = cv2.imread(str(path))
+            if image is not None:
+                return image, str(path)
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, 1024, dtype=np.float32)
+    image = (gradient[None, :, None] * 0.5 + gradient[:, None, None] * 0.5).astype(np.uint8).repeat(3, axis=2)
+    return cv2.add(image, rng.integers(0, 40, image.shape, dtype=np.uint8)), "synthetic"
+
+def resized(image, long_side):
+    height, width = image.shape[:2]
+    factor = long_side / max(height, width)
+    interpolation = cv2.INTER_AREA if factor < 1 else cv2.INTER_CUBIC
+    return cv2.resize(image, (max(1, round(width * factor)), max(1, round(height * factor))),
+                      interpolation=interpolation)
+
+def synthetic_boxes(image, count, class_count, seed=0):
+    """count random (xyxy, conf, cls) boxes inside the image, spread over the model's classes"""
+    rng = np.random.default_rng(seed)
+    height, width = image.shape[:2]
+    x1 = rng.uniform(0, width * 0.8, count)
+    y1 = rng.uniform(0, height * 0.8, count)
+    x2 = np.minimum(x1 + rng.uniform(16, width * 0.2, count), width)
+    y2 = np.minimum(y1 + rng.uniform(16, height * 0.2, count), height)
+    xyxy = np.stack([x1, y1, x2, y2], axis=1).astype(np.float32)
+    conf = rng.uniform(0.05, 1.0, count).astype(np.float32)
+    cls = rng.integers(0, max(1, class_count), count).astype(np.float32)
+    return xyxy, conf, cls
+
+def run_benchmarks(args):
+    options = {"warmup": args.warmup, "min_repeats": args.repeats, "max_repeats": args.max_repeats,
+               "target_ci": args.target_ci, "time_budget": args.time_budget}
+    stages = args.stages.split(",")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(sorted(unknown))} (expected {', '.join(STAGES)})")
+
+    if main.model is None:
+        main.load_model()
+
+    base_image, image_source = source_image(args.dataset)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    detection_counts = [int(count) for count in args.detections.split(",")]
+    needs_model = {"inference_cold", "inference_warm", "postprocess", "crop_encode"} & set(stages)
+    if needs_model and main.model is None:
+        print(f"Warning: no model loaded from {main.MODEL_PATH}; skipping {', '.join(sorted(needs_model))}")
+        stages = [stage for stage in stages if stage not in needs_model]
+
+    results = []
+
+    def record(stage, params, stats):
+        results.append({"stage": stage, "params": params, "stats": stats})
+        described = ", ".join(f"{key}={value}" for key, value in params.items())
+        print(f"{stage:<15} {described:<40} mean {stats['mean_ms']:9.3f} ms  ±{stats['ci95_ms']:.3f}  "
+              f"p95 {stats['p95_ms']:9.3f}  (n={stats['n']})")
+
+    for size in sizes:
+        image = resized(base_image, size)
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        data = encoded.tobytes()
+        dims = f"{image.shape[1]}x{image.shape[0]}"
+
+        if "decode" in stages:
+            record("decode", {"size": dims, "scale": 1},
+                   measure(lambda: main.decode_image_bytes(data), **options))
+            scale = main.decode_scale_for(main.io.BytesIO(data))
+            if scale != 1:
+                record("decode", {"size": dims, "scale": scale},
+                       measure(lambda: main.decode_image_bytes(data, scale), **options))
+
+        if "inference_warm" in stages:
+            record("inference_warm", {"size": dims, "imgsz": main.INFERENCE_IMGSZ},
+                   measure(lambda: main.model(image, imgsz=main.INFERENCE_IMGSZ, verbose=False), **options))
+
+    if "inference_cold" in stages:
+        # A fresh model's first call pays for lazy initialisation (and fusing for .pt weights)
+        image = resized(base_image, sizes[0])
+        holder = {}
+
+        from ultralytics import YOLO
+
+        def load_fresh():
+            holder["model"] = YOLO(main.backend_info.get("artifact") or main.MODEL_PATH, task="detect")
+
+        cold_options = dict(options, warmup=0, min_repeats=min(args.repeats, args.cold_repeats),
+                            max_repeats=args.cold_repeats)
+        record("inference_cold", {"size": f"{image.shape[1]}x{image.shape[0]}", "imgsz": main.INFERENCE_IMGSZ},
+               measure(lambda: holder["model"](image, imgsz=main.INFERENCE_IMGSZ, verbose=False),
+                       setup=load_fresh, **cold_options))
+
+    image = resized(base_image, sizes[-1])
+    for count in detection_counts:
+        box_arrays = [synthetic_boxes(image, count, len(main.model.names) if main.model is not None else 1)]
+
+        if "postprocess" in stages:
+            record("postprocess", {"detections": count},
+                   measure(lambda: main.detections_from_arrays(box_arrays, image, "0" * 32), **options))
+
+        if "crop_encode" in stages:
+            result = main.detections_from_arrays(box_arrays, image, "1" * 32)
+            crop_ids = [detection["cropped_image"].rsplit("/", 1)[-1] for detection in result["detections"]]
+            crop_paths = [os.path.join(main.uploads_dir, f"{crop_id}.{main.CROP_FORMAT}") for crop_id in crop_ids]
+
+            def remove_crops():
+                # Crops are rendered once and then served from disk; remove them so every run encodes
+                for path in crop_paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+            def render_all():
+                for crop_id in crop_ids:
+                    main.render_crop(crop_id)
+
+            record("crop_encode", {"detections": count, "unique_crops": len(crop_ids), "format": main.CROP_FORMAT},
+                   measure(render_all, setup=remove_crops, **options))
+            remove_crops()
+
+    if "meaning_lookup" in stages:
+        names = list(main.model.names.values()) if main.model is not None else ["unity"]
+        for language in main.Language:
+            record("meaning_lookup", {"language": language.value, "names": len(names)},
+                   measure(lambda: [main.get_ornament_meaning(name, language) for name in names], **options))
+
+    import torch
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "model_path": main.MODEL_PATH,
+            "backend": main.backend_info.get("name"),
+            "inference_imgsz": main.INFERENCE_IMGSZ,
+        },
+        "config": {
+            "image_source": image_source,
+            "sizes": sizes,
+            "detections": detection_counts,
+            "stages": stages,
+            **options,
+            "cold_repeats": args.cold_repeats,
+        },
+        "results": results,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the detection pipeline stages offline")
+    parser.add_argument("--dataset", default=str(DEFAULT_DATASET), help="Folder to take the test image from")
+    parser.add_argument("--sizes", default="640,1920,4032", help="Long-side image sizes to test")
+    parser.add_argument("--detections", default="0,10,100,500", help="Box counts for post-processing and crops")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Stages to run ({', '.join(STAGES)})")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed runs before measuring")
+    parser.add_argument("--repeats", type=int, default=10, help="Minimum timed runs per benchmark")
+    parser.add_argument("--max-repeats", type=int, default=200, help="Maximum timed runs per benchmark")
+    parser.add_argument("--target-ci", type=float, default=0.05,
+                        help="Stop once the 95%% CI half-width is within this fraction of the mean")
+    parser.add_argument("--time-budget", type=float, default=30.0, help="Seconds per benchmark before giving up")
+    parser.add_argument("--cold-repeats", type=int, default=3, help="Fresh model loads for inference_cold")
+    parser.add_argument("--output", "-o", help="Write results as JSON to this file")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Keep the API's per-request info logging on")
+
+    args = parser.parse_args()
+    if not args.verbose:
+        main.logger.setLevel(logging.ERROR)
+    report = run_benchmarks(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote results to {args.output}")
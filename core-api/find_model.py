@@ -2,46 +2,52 @@
 
 import os
 import sys
-import re
+import json
+import argparse
+import urllib.error
+import urllib.parse
+import urllib.request
 from pathlib import Path
 
+from model_catalog import ModelCatalog
+
 def find_pt_files(root_dir):
-    """Find all .pt files in the directory tree"""
+    """Find all .pt files in the directory tree, newest first (only new or changed files are read)"""
     print(f"Searching for .pt files in {root_dir}...")
-    pt_files = []
-    for root, dirs, files in os.walk(root_dir):
-        for file in files:
-            if file.endswith('.pt'):
-                full_path = os.path.join(root, file)
-                size_mb = os.path.getsize(full_path) / (1024 * 1024)
-                pt_files.append((full_path, size_mb))
-    return sorted(pt_files, key=lambda x: x[1], reverse=True)  # Sort by file size
+    catalog = ModelCatalog()
+    catalog.refresh([root_dir])
+    catalog.save()
+    return catalog.query(kind="pt", sort="mtime")
 
-def update_model_path(main_py_path, new_model_path):
-    """Update the model path in main.py"""
-    # Normalize the path relative to core-api directory
-    current_dir = os.path.dirname(main_py_path)
-    rel_path = os.path.relpath(new_model_path, current_dir)
-    
-    print(f"Updating model path in {main_py_path} to {rel_path}...")
-    
-    with open(main_py_path, 'r') as file:
-        content = file.read()
+def load_on_server(api_url, model_path, token=None, activate=True):
+    """Ask a running API to load the model in the background and switch traffic to it once it is warm"""
+    url = f"{api_url.rstrip('/')}/admin/models"
+    data = urllib.parse.urlencode({"path": os.path.abspath(model_path), "activate": str(activate).lower()}).encode()
+    request = urllib.request.Request(url, data=data, method="POST")
+    if token:
+        request.add_header("X-Admin-Token", token)
     
-    # Replace the model path
-    updated_content = re.sub(
-        r'model_path\s*=\s*"[^"]+"',
-        f'model_path = "{rel_path}"',
-        content
-    )
+    print(f"Asking {url} to load {model_path}...")
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            version = json.load(response)
+    except urllib.error.HTTPError as e:
+        print(f"Server refused the model ({e.code}): {e.read().decode(errors='replace')}")
+        return False
+    except urllib.error.URLError as e:
+        print(f"Could not reach the API at {api_url}: {e.reason}")
+        return False
     
-    # Write back to file
-    with open(main_py_path, 'w') as file:
-        file.write(updated_content)
-    
-    print(f"Updated model path in {main_py_path}")
+    print(f"Loading as version {version['name']}; check progress at {url}")
+    return True
 
 def main():
+    parser = argparse.ArgumentParser(description="Pick a trained .pt model for the API")
+    parser.add_argument("--api-url", help="Load the chosen model into this running API (e.g. http://localhost:8000)")
+    parser.add_argument("--admin-token", default=os.getenv("ADMIN_TOKEN"), help="X-Admin-Token for the API")
+    parser.add_argument("--no-activate", action="store_true", help="Load the model without switching traffic to it")
+    args = parser.parse_args()
+    
     # Get the project root directory
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.abspath(os.path.join(script_dir, ".."))
@@ -54,8 +60,12 @@ def main():
         return 1
     
     print(f"\nFound {len(pt_files)} .pt files:")
-    for i, (file_path, size_mb) in enumerate(pt_files):
-        print(f"{i+1}. {file_path} ({size_mb:.2f} MB)")
+    for i, entry in enumerate(pt_files):
+        size_mb = entry["size"] / (1024 * 1024)
+        details = [f"{size_mb:.2f} MB", f"{len(entry['names'] or {})} classes"]
+        if entry["latency_ms"] is not None:
+            details.append(f"{entry['latency_ms']:.1f} ms")
+        print(f"{i+1}. {entry['path']} ({', '.join(details)})")
     
     # Let user choose which file to use
     while True:
@@ -66,19 +76,21 @@ def main():
         try:
             index = int(choice) - 1
             if 0 <= index < len(pt_files):
-                selected_file = pt_files[index][0]
+                selected_file = pt_files[index]["path"]
                 break
             else:
                 print("Invalid selection, please try again.")
         except ValueError:
             print("Please enter a number or 'q'.")
     
-    # Update main.py with the new path
-    main_py_path = os.path.join(script_dir, "main.py")
-    update_model_path(main_py_path, selected_file)
+    if args.api_url:
+        return 0 if load_on_server(args.api_url, selected_file, args.admin_token, not args.no_activate) else 1
     
-    print("\nModel path updated. You should now be able to run the API.")
-    print("To start the API server, run: ./run_api.sh")
+    rel_path = os.path.relpath(selected_file, script_dir)
+    print("\nTo start the API server with this model, run:")
+    print(f"  MODEL_PATH={rel_path} ./run_api.sh")
+    print("Or load it into a running server without a restart:")
+    print("  python find_model.py --api-url http://localhost:8000")
     
     return 0
 
@@ -1,23 +1,46 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, File, UploadFile, Form, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exception_handlers import http_exception_handler
+from fastapi.concurrency import run_in_threadpool
 import shutil
 import os
 import uuid
 from pathlib import Path
 import sys
-import pandas as pd
+import csv
 import cv2
 import numpy as np
 import tempfile
+import io
+import zipfile
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+import itertools
+import hashlib
+import random
+import hmac
+import re
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from types import MappingProxyType
 from enum import Enum
 import traceback
-from typing import List, Dict, Any, Optional
+from importlib import metadata, util as importlib_util
+from typing import Callable, List, Dict, Any, Optional, Set, Tuple
 import logging
 import json
-import torch
+from PIL import Image as PILImage
+
+from model_catalog import ModelCatalog, file_sha256
+from model_worker import model_worker_main, result_arrays
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -27,14 +50,8 @@ logger = logging.getLogger(__name__)
 # Add the project root to path to import YOLO
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
-# Try to import YOLO with detailed error handling
-try:
-    from ultralytics import YOLO
-    logger.info("Successfully imported ultralytics")
-except ImportError as e:
-    logger.error(f"Failed to import ultralytics: {str(e)}")
-    logger.error("Make sure ultralytics is installed: pip install ultralytics")
-    raise
+# torch, torchvision and ultralytics take seconds to import; they are imported where first needed,
+# so the server can bind its port before the model is loaded
 
 # Define language options
 class Language(str, Enum):
@@ -69,49 +86,1143 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
+# Latency histogram buckets (seconds) for the per-stage metrics served at /metrics
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_STAGES = ("upload_read", "decode", "inference", "postprocess", "crop_encode", "meaning_lookup",
+                  "serialization")
+
+@contextmanager
+def timed_stage(timings: Optional[Dict[str, float]], stage: str):
+    """Add the seconds spent in the block to timings[stage]"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+def merge_timings(timings: Dict[str, float], other: Optional[Dict[str, float]]) -> Dict[str, float]:
+    """Add the stage seconds of other into timings"""
+    for stage, seconds in (other or {}).items():
+        timings[stage] = timings.get(stage, 0.0) + seconds
+    return timings
+
+class Metrics:
+    """Request counters and per-stage latency histograms, rendered in Prometheus text format"""
+    
+    def __init__(self, buckets: Tuple[float, ...] = METRICS_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = {}  # (method, endpoint, status) -> count
+        self.errors: Dict[Tuple[str, str], int] = {}  # (method, endpoint) -> 5xx count
+        # stage -> [cumulative count per bucket..., +Inf count], plus the sum of observed seconds
+        self.stage_counts: Dict[str, List[int]] = {stage: [0] * (len(buckets) + 1) for stage in METRICS_STAGES}
+        self.stage_sums: Dict[str, float] = {stage: 0.0 for stage in METRICS_STAGES}
+        # Only touched from the event loop thread
+        self.in_flight = 0
+    
+    def count_request(self, method: str, endpoint: str, status: int):
+        with self._lock:
+            key = (method, endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if status >= 500:
+                self.errors[(method, endpoint)] = self.errors.get((method, endpoint), 0) + 1
+    
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            counts = self.stage_counts.setdefault(stage, [0] * (len(self.buckets) + 1))
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[index] += 1
+            counts[-1] += 1
+            self.stage_sums[stage] = self.stage_sums.get(stage, 0.0) + seconds
+    
+    def observe_timings(self, timings: Dict[str, float]):
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+    
+    @contextmanager
+    def time(self, stage: str):
+        timings: Dict[str, float] = {}
+        with timed_stage(timings, stage):
+            yield
+        self.observe(stage, timings[stage])
+    
+    def render(self, gauges: List[Tuple[str, str, Dict[str, Any], float]]) -> str:
+        """Prometheus text exposition; gauges are (name, help, labels, value) tuples"""
+        lines = []
+        with self._lock:
+            lines += ["# HELP ornament_requests_total HTTP requests by method, endpoint and status code.",
+                      "# TYPE ornament_requests_total counter"]
+            for (method, endpoint, status), count in sorted(self.requests.items()):
+                labels = prometheus_labels({"method": method, "endpoint": endpoint, "status": status})
+                lines.append(f"ornament_requests_total{labels} {count}")
+            lines += ["# HELP ornament_request_errors_total HTTP requests that ended with a 5xx status.",
+                      "# TYPE ornament_request_errors_total counter"]
+            for (method, endpoint), count in sorted(self.errors.items()):
+                labels = prometheus_labels({"method": method, "endpoint": endpoint})
+                lines.append(f"ornament_request_errors_total{labels} {count}")
+            
+            lines += ["# HELP ornament_stage_duration_seconds Time spent in each processing stage per request.",
+                      "# TYPE ornament_stage_duration_seconds histogram"]
+            name = "ornament_stage_duration_seconds"
+            for stage, counts in self.stage_counts.items():
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{name}_bucket{prometheus_labels({'stage': stage, 'le': bound})} {count}")
+                lines.append(f"{name}_bucket{prometheus_labels({'stage': stage, 'le': '+Inf'})} {counts[-1]}")
+                lines.append(f"{name}_sum{prometheus_labels({'stage': stage})} {self.stage_sums[stage]}")
+                lines.append(f"{name}_count{prometheus_labels({'stage': stage})} {counts[-1]}")
+        
+        lines += ["# HELP ornament_requests_in_flight HTTP requests currently being handled.",
+                  "# TYPE ornament_requests_in_flight gauge",
+                  f"ornament_requests_in_flight {self.in_flight}"]
+        described = set()
+        for name, help_text, labels, value in gauges:
+            if name not in described:
+                described.add(name)
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines.append(f"{name}{prometheus_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+def prometheus_labels(labels: Dict[str, Any]) -> str:
+    """Format labels as {key="value",...}, escaping backslashes, quotes and newlines"""
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+metrics = Metrics()
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    """Count every HTTP request by its route template (not the raw path, which may contain ids)"""
+    metrics.in_flight += 1
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.in_flight -= 1
+        route = request.scope.get("route")
+        metrics.count_request(request.method, getattr(route, "path", "unmatched"), status)
+
+# Per-request tracing: a Server-Timing header on /detect/, and 1-in-N stack-sampled profiles written to disk
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 0 disables profiling
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # /admin endpoints require it in X-Admin-Token; unset disables them
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    """Format stage seconds as a Server-Timing header value (durations in milliseconds)"""
+    entries = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(entries)
+
+class StackSampler:
+    """Background thread that samples the Python stack of every thread at a fixed interval
+
+    Stacks are counted in collapsed form ("thread;outer;...;inner"), which flamegraph.pl and speedscope read.
+    Unlike cProfile it also sees the threadpool and inference executor threads working on the request.
+    """
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+    
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+class RequestProfiler:
+    """Profiles 1 in sample_rate requests with a StackSampler and saves each profile to PROFILE_DIR"""
+    
+    def __init__(self, sample_rate: int = PROFILE_SAMPLE_RATE, interval_ms: float = PROFILE_INTERVAL_MS,
+                 directory: str = PROFILE_DIR):
+        self.sample_rate = sample_rate
+        self.interval_ms = interval_ms
+        self.directory = directory
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self.profiles_written = 0
+        self.last_profile: Optional[str] = None
+    
+    def configure(self, sample_rate: int, interval_ms: Optional[float] = None):
+        self.sample_rate = max(0, sample_rate)
+        if interval_ms is not None:
+            self.interval_ms = max(0.1, interval_ms)
+    
+    def maybe_start(self) -> Optional[StackSampler]:
+        """Start a sampler if this request is one of the 1-in-N sampled ones"""
+        if self.sample_rate <= 0 or next(self._counter) % self.sample_rate:
+            return None
+        sampler = StackSampler(self.interval_ms / 1000)
+        sampler.start()
+        return sampler
+    
+    def finish(self, sampler: StackSampler, name: str, timings: Dict[str, float]) -> str:
+        """Stop a sampler and write its collapsed stacks, headed by the request's stage timings"""
+        counts = sampler.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{uuid.uuid4().hex[:8]}.folded"
+        path = os.path.join(self.directory, filename)
+        with open(path, "w") as f:
+            f.write(f"# {sampler.samples} samples every {sampler.interval * 1000:g} ms; "
+                    f"stage timings: {server_timing_header(timings, sum(timings.values()))}\n")
+            for stack, count in sorted(counts.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+        with self._lock:
+            self.profiles_written += 1
+            self.last_profile = path
+        logger.info(f"Wrote request profile {path} ({sampler.samples} samples)")
+        return path
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.sample_rate > 0,
+                "sample_rate": self.sample_rate,
+                "interval_ms": self.interval_ms,
+                "directory": os.path.abspath(self.directory),
+                "profiles_written": self.profiles_written,
+                "last_profile": self.last_profile,
+            }
+
+request_profiler = RequestProfiler()
+
+def require_admin(token: Optional[str]):
+    """Reject admin calls without the right X-Admin-Token; without ADMIN_TOKEN the admin endpoints don't exist"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Admin-Token")
+
+def require_single_server_worker(action: str):
+    """Refuse admin calls that change in-memory state when there are several server workers
+
+    Each worker is its own process and the call would only reach the one that accepted the connection, leaving
+    the others serving with the old model or profiler settings.
+    """
+    if SERVER_WORKERS > 1:
+        raise HTTPException(status_code=409, detail=f"Cannot {action} with {SERVER_WORKERS} server workers: the "
+                                                    "change would only reach one of them. Restart with the new "
+                                                    "settings instead")
+
 # Load the trained model
 MODEL_PATH = os.getenv("MODEL_PATH", "models/best.pt")
 model = None
 
-# Check if model file exists
-if not os.path.exists(MODEL_PATH):
-    logger.error(f"Model file not found at {MODEL_PATH}")
-    logger.error(f"Current working directory: {os.getcwd()}")
-    logger.error(f"Directory contents: {os.listdir('.')}")
-    logger.error(f"Looking for model in: {os.path.abspath(MODEL_PATH)}")
-else:
+# "background" binds the port first and loads the model in a thread; "blocking" loads it at import
+MODEL_LOAD = os.getenv("MODEL_LOAD", "background").lower()
+MODEL_WAIT_TIMEOUT = float(os.getenv("MODEL_WAIT_TIMEOUT", "30"))  # seconds a request waits for the model
+
+# Loading progress for the readiness probe; model_load_done is set once loading ends, successfully or not
+model_state: Dict[str, Any] = {"state": "pending", "error": None, "started_at": None, "load_seconds": None,
+                               "cache": None, "source_sha256": None, "torch_threads": None}
+model_load_done = threading.Event()
+
+# Fused, eval-mode copies of the .pt weights, keyed by the checksum of the source file; "" disables the cache
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "model_cache")
+
+# Index of the .pt and exported models on disk (see model_catalog.py); MODEL_CATALOG_PATH sets the index file
+MODEL_CATALOG_ROOTS = [root for root in os.getenv("MODEL_CATALOG_ROOTS", ".").split(",") if root]
+artifact_catalog = ModelCatalog()
+
+def record_catalog_latency(path: str, latency_ms: Optional[float]):
+    """Store a latency measured at load time in the model catalog, cataloguing the artifact first if needed"""
+    if latency_ms is None:
+        return
+    try:
+        if artifact_catalog.get(path) is None:
+            artifact_catalog.refresh([os.path.dirname(os.path.abspath(path))])
+        artifact_catalog.record_latency(path, latency_ms)
+    except Exception as e:
+        logger.warning(f"Could not record latency of {path} in the model catalog: {str(e)}")
+
+# Minimum confidence for a box to count as a detection
+CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.25"))
+
+# Content-addressed detection result cache
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+
+# Batch detection settings
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "200"))
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", str(512 * 1024 * 1024)))  # uncompressed images per batch
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+# Video detection: frames are sampled at VIDEO_SAMPLE_FPS and skipped if they barely changed
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "2"))
+VIDEO_DIFF_THRESHOLD = float(os.getenv("VIDEO_DIFF_THRESHOLD", "8"))  # mean absolute gray-level difference
+VIDEO_MAX_PROCESSED_FRAMES = int(os.getenv("VIDEO_MAX_PROCESSED_FRAMES", "300"))
+VIDEO_DIFF_SIZE = 64  # frames are compared as 64x64 grayscale thumbnails
+
+# Live camera streams over WebSocket
+WS_MAX_STREAMS = int(os.getenv("WS_MAX_STREAMS", "4"))
+
+# Tiled inference for high-resolution photos: "off", "auto" (above TILE_AUTO_MEGAPIXELS) or "always"
+TILING = os.getenv("TILING", "auto").lower()
+TILE_SIZE = int(os.getenv("TILE_SIZE", "1024"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+TILE_AUTO_MEGAPIXELS = float(os.getenv("TILE_AUTO_MEGAPIXELS", "12"))
+TILE_NMS_IOU = float(os.getenv("TILE_NMS_IOU", "0.5"))
+TILE_INCLUDE_FULL_IMAGE = os.getenv("TILE_INCLUDE_FULL_IMAGE", "true").lower() in ("1", "true", "yes")
+
+# Uploads up to this size are decoded straight from memory; larger ones are spilled to disk first
+UPLOAD_MEMORY_LIMIT = int(os.getenv("UPLOAD_MEMORY_LIMIT", str(32 * 1024 * 1024)))
+
+# Long side the model letterboxes images to (exported backends are built for this size too)
+INFERENCE_IMGSZ = int(os.getenv("INFERENCE_IMGSZ", "640"))
+
+# Large JPEGs are decoded at 1/2, 1/4 or 1/8 scale (libjpeg DCT scaling) when the model would downscale them anyway
+REDUCED_DECODE = os.getenv("REDUCED_DECODE", "true").lower() in ("1", "true", "yes")
+REDUCED_DECODE_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+# Micro-batching scheduler settings (groups concurrent /detect/ requests into one forward pass)
+MICROBATCH_ENABLED = os.getenv("MICROBATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+MICROBATCH_WINDOW_MS = float(os.getenv("MICROBATCH_WINDOW_MS", "10"))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "8"))
+MICROBATCH_TIMEOUT = float(os.getenv("MICROBATCH_TIMEOUT", "60"))
+
+# Executor for blocking inference, so the event loop stays free for other requests and /status
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread").lower()  # "thread" or "process"
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "32"))
+
+# Server processes sharing the machine's CPUs: set by serve.py, or WEB_CONCURRENCY (uvicorn's default for --workers)
+SERVER_WORKERS = max(1, int(os.getenv("SERVER_WORKERS", os.getenv("WEB_CONCURRENCY", "1"))))
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))  # 0 = available CPUs // SERVER_WORKERS
+
+def available_cpus() -> int:
+    """CPUs this process may run on (the affinity mask, which containers and taskset narrow)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def configure_torch_threads(workers: int = SERVER_WORKERS) -> int:
+    """Give torch an equal share of the CPUs per server process, so N workers don't oversubscribe them"""
+    import torch
+    threads = TORCH_THREADS or max(1, available_cpus() // max(1, workers))
+    torch.set_num_threads(threads)
+    return threads
+
+# Dedicated model-worker processes fed through shared memory (0 disables the pool)
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "0"))
+MODEL_WORKER_THREADS = int(os.getenv("MODEL_WORKER_THREADS", "0"))  # 0 = CPUs per server process // MODEL_WORKERS
+MODEL_WORKER_TIMEOUT = float(os.getenv("MODEL_WORKER_TIMEOUT", "60"))
+
+# Inference backend: "torch", "torchscript", "onnx", "openvino", or "auto" to benchmark and pick the fastest
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+BACKEND_BENCHMARK_RUNS = int(os.getenv("BACKEND_BENCHMARK_RUNS", "3"))
+BACKEND_NAMES = ("torch", "torchscript", "onnx", "openvino")
+# Exported with a dynamic batch axis; torchscript is traced at a fixed batch and may only take one image at a time
+DYNAMIC_BATCH_BACKENDS = ("onnx", "openvino")
+
+# Which backend is serving requests, and how fast each candidate was at startup
+backend_info: Dict[str, Any] = {"name": None, "artifact": None, "latency_ms": None, "benchmarks": {}}
+# backend -> path of the export load_backend actually loaded
+exported_artifacts: Dict[str, str] = {}
+
+def exported_artifact_path(backend: str) -> str:
+    """Where ultralytics writes (and we look for) the exported weights of a backend"""
+    stem = os.path.splitext(MODEL_PATH)[0]
+    return {
+        "torchscript": f"{stem}.torchscript",
+        "onnx": f"{stem}.onnx",
+        "openvino": f"{stem}_openvino_model",
+    }[backend]
+
+def export_backend(backend: str) -> str:
+    """Export the MODEL_PATH weights to a backend, with a dynamic batch axis where the format supports one
+
+    ultralytics writes an export next to the weights it was loaded from, so this exports from MODEL_PATH itself
+    rather than from the serving model, which may have come from the model cache.
+    """
+    from ultralytics import YOLO
+    logger.info(f"Exporting {MODEL_PATH} to {backend}")
+    source = YOLO(MODEL_PATH, task="detect")
+    if backend in DYNAMIC_BATCH_BACKENDS:
+        return source.export(format=backend, imgsz=INFERENCE_IMGSZ, dynamic=True, batch=BATCH_SIZE)
+    return source.export(format=backend, imgsz=INFERENCE_IMGSZ)
+
+def accepts_batches(backend_model) -> bool:
+    """Whether the model runs several images in one call (exports with a fixed batch of 1 fail here)"""
+    dummy = np.zeros((INFERENCE_IMGSZ, INFERENCE_IMGSZ, 3), dtype=np.uint8)
+    try:
+        return len(backend_model([dummy, dummy], imgsz=INFERENCE_IMGSZ, verbose=False)) == 2
+    except Exception as e:
+        logger.info(f"Model does not accept batches: {str(e)}")
+        return False
+
+def batch_limit(detector) -> int:
+    """Most images to pass the detector in one call: BATCH_SIZE, or 1 for exports with a fixed batch"""
+    return getattr(detector, "max_batch", None) or BATCH_SIZE
+
+def load_backend(backend: str, base_model):
+    """Return a YOLO model for the backend, exporting the .pt weights first if needed
+
+    The returned model's max_batch is 1 if its export only takes one image per call.
+    """
+    if backend == "torch":
+        return base_model
+    
+    from ultralytics import YOLO
+    artifact = exported_artifact_path(backend)
+    exported = False
+    if not os.path.exists(artifact) or os.path.getmtime(artifact) < os.path.getmtime(MODEL_PATH):
+        artifact = export_backend(backend)
+        exported = True
+    
+    logger.info(f"Loading {backend} backend from {artifact}")
+    backend_model = YOLO(artifact, task="detect")
+    if not accepts_batches(backend_model) and backend in DYNAMIC_BATCH_BACKENDS and not exported:
+        # Left over from an export with a fixed batch size
+        artifact = export_backend(backend)
+        backend_model = YOLO(artifact, task="detect")
+    if not accepts_batches(backend_model):
+        logger.warning(f"{backend} export takes one image at a time, batches will be split")
+        backend_model.max_batch = 1
+    exported_artifacts[backend] = artifact
+    return backend_model
+
+def benchmark_backend(backend_model, runs: int = BACKEND_BENCHMARK_RUNS, batch_size: int = 1) -> float:
+    """Median latency in ms per image of running batch_size blank warm-up images, split as served"""
+    dummy = np.zeros((INFERENCE_IMGSZ, INFERENCE_IMGSZ, 3), dtype=np.uint8)
+    images = [dummy] * batch_size
+    step = batch_limit(backend_model)
+    
+    def forward():
+        for start in range(0, batch_size, step):
+            backend_model(images[start:start + step], imgsz=INFERENCE_IMGSZ, verbose=False)
+    
+    forward()  # warm-up
+    timings = []
+    for _ in range(max(1, runs)):
+        started = time.perf_counter()
+        forward()
+        timings.append((time.perf_counter() - started) * 1000 / batch_size)
+    return float(np.median(timings))
+
+def served_batch_sizes() -> List[int]:
+    """Batch sizes requests reach the model with: single images, micro-batches and BATCH_SIZE chunks"""
+    sizes = {1, BATCH_SIZE}
+    if MICROBATCH_ENABLED:
+        sizes.add(MICROBATCH_MAX_SIZE)
+    return sorted(sizes)
+
+def select_backend(base_model):
+    """Load the configured backend (or benchmark all of them for "auto") and return the model to serve"""
+    candidates = BACKEND_NAMES if INFERENCE_BACKEND == "auto" else (INFERENCE_BACKEND,)
+    
+    loaded = {}
+    for backend in candidates:
+        if backend not in BACKEND_NAMES:
+            logger.error(f"Unknown inference backend '{backend}', expected one of {', '.join(BACKEND_NAMES)} or auto")
+            continue
+        try:
+            loaded[backend] = load_backend(backend, base_model)
+        except Exception as e:
+            logger.warning(f"Backend {backend} unavailable: {str(e)}")
+    if not loaded:
+        logger.warning("No requested backend could be loaded, falling back to torch")
+        loaded["torch"] = base_model
+    
+    # Candidates are ranked by their mean per-image latency over the batch sizes actually served
+    benchmarks = {}
+    batch_benchmarks = {}
+    if BACKEND_BENCHMARK_RUNS > 0:
+        for backend, backend_model in loaded.items():
+            try:
+                by_size = {size: benchmark_backend(backend_model, batch_size=size) for size in served_batch_sizes()}
+            except Exception as e:
+                logger.warning(f"Backend {backend} failed its benchmark: {str(e)}")
+                continue
+            batch_benchmarks[backend] = {str(size): latency_ms for size, latency_ms in by_size.items()}
+            benchmarks[backend] = float(np.mean(list(by_size.values())))
+            logger.info(f"Backend {backend}: " + ", ".join(f"{latency_ms:.1f} ms per image at batch {size}"
+                                                          for size, latency_ms in by_size.items()))
+    
+    if benchmarks:
+        chosen = min(benchmarks, key=benchmarks.get)
+    else:
+        chosen = next(iter(loaded))
+    
+    backend_info.update({
+        "name": chosen,
+        "artifact": MODEL_PATH if chosen == "torch" else exported_artifacts[chosen],
+        "latency_ms": batch_benchmarks.get(chosen, {}).get("1"),
+        "max_batch": batch_limit(loaded[chosen]),
+        "benchmarks": benchmarks,
+        "batch_benchmarks": batch_benchmarks,
+    })
+    logger.info(f"Serving with {chosen} backend")
+    return loaded[chosen]
+
+def model_cache_paths(path: str, source_sha: str, device) -> Tuple[str, str]:
+    """Artifact and metadata paths of the cached model for this source checksum and device"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    base = os.path.join(MODEL_CACHE_DIR, f"{stem}-{source_sha[:16]}-{device.type}")
+    return f"{base}.pt", f"{base}.json"
+
+def model_cache_versions() -> Dict[str, str]:
+    """Library versions the pickled artifact depends on; a mismatch means it has to be rebuilt"""
+    import torch
+    import ultralytics
+    return {"torch": torch.__version__, "ultralytics": ultralytics.__version__}
+
+def load_cached_model(path: str, source_sha: str, device):
+    """The cached fused model for these weights, or None if there is no usable artifact"""
+    from ultralytics import YOLO
+    artifact, meta_path = model_cache_paths(path, source_sha, device)
+    if not os.path.exists(artifact) or not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("source_sha256") != source_sha or meta.get("versions") != model_cache_versions():
+            logger.info(f"Model cache {artifact} is stale, rebuilding it")
+            return None
+        loaded = YOLO(artifact, task="detect")
+        loaded.to(device)
+        return loaded
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable model cache {artifact}: {str(e)}")
+        return None
+
+def save_model_cache(loaded, path: str, source_sha: str, device):
+    """Save the fused, eval-mode model in the ultralytics checkpoint format, plus its metadata"""
+    import torch
+    artifact, meta_path = model_cache_paths(path, source_sha, device)
+    try:
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        network = loaded.model.fuse().eval().float()
+        train_args = getattr(network, "args", None) or {}
+        if not isinstance(train_args, dict):
+            train_args = vars(train_args)
+        # Written to temporary files and renamed, so workers booting together never read a partial artifact
+        temp_artifact = f"{artifact}.{os.getpid()}.tmp"
+        torch.save({"model": network, "train_args": dict(train_args, task="detect"),
+                    "source_sha256": source_sha}, temp_artifact)
+        os.replace(temp_artifact, artifact)
+        temp_meta = f"{meta_path}.{os.getpid()}.tmp"
+        with open(temp_meta, "w") as f:
+            json.dump({
+                "source": os.path.abspath(path),
+                "source_sha256": source_sha,
+                "device": device.type,
+                "names": loaded.names,
+                "versions": model_cache_versions(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            }, f, indent=2)
+        os.replace(temp_meta, meta_path)
+        logger.info(f"Cached fused model at {artifact}")
+    except Exception as e:
+        logger.warning(f"Could not write model cache {artifact}: {str(e)}")
+
+def load_base_model(path: Optional[str] = None, state: Optional[Dict[str, Any]] = None):
+    """Load .pt weights (MODEL_PATH by default) and check them with a dummy forward pass; None if that fails
+
+    Errors, the cache outcome and the weights' checksum are recorded in state (model_state by default).
+    """
+    path = path or MODEL_PATH
+    state = model_state if state is None else state
+    # Check if model file exists
+    if not os.path.exists(path):
+        logger.error(f"Model file not found at {path}")
+        logger.error(f"Current working directory: {os.getcwd()}")
+        logger.error(f"Directory contents: {os.listdir('.')}")
+        logger.error(f"Looking for model in: {os.path.abspath(path)}")
+        state["error"] = f"Model file not found at {path}"
+        return None
+    
+    # Try to import YOLO with detailed error handling
+    try:
+        import torch
+        from ultralytics import YOLO
+        logger.info("Successfully imported ultralytics")
+    except ImportError as e:
+        logger.error(f"Failed to import ultralytics: {str(e)}")
+        logger.error("Make sure ultralytics is installed: pip install ultralytics")
+        state["error"] = f"Failed to import ultralytics: {str(e)}"
+        return None
+    
     try:
-        logger.info(f"Attempting to load model from {MODEL_PATH}")
-        logger.info(f"Model file size: {os.path.getsize(MODEL_PATH)} bytes")
+        logger.info(f"Attempting to load model from {path}")
+        logger.info(f"Model file size: {os.path.getsize(path)} bytes")
         
         # Try to load the model with explicit device
         device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         logger.info(f"Using device: {device}")
         
-        model = YOLO(MODEL_PATH)
-        model.to(device)
+        source_sha = file_sha256(path)
+        state["source_sha256"] = source_sha
+        loaded = load_cached_model(path, source_sha, device) if MODEL_CACHE_DIR else None
+        state["cache"] = "hit" if loaded is not None else ("miss" if MODEL_CACHE_DIR else "disabled")
+        if loaded is None:
+            loaded = YOLO(path)
+            loaded.to(device)
         
         # Test the model with a small tensor to ensure it's working
         test_input = torch.zeros((1, 3, 640, 640), device=device)
         with torch.no_grad():
-            model(test_input)
+            loaded(test_input)
         
-        logger.info(f"Model loaded successfully from {MODEL_PATH}")
-        logger.info(f"Model classes: {model.names}")
+        if state["cache"] == "miss":
+            save_model_cache(loaded, path, source_sha, device)
+        
+        logger.info(f"Model loaded successfully from {path} (cache {state['cache']})")
+        logger.info(f"Model classes: {loaded.names}")
+        return loaded
     except Exception as e:
         logger.error(f"Failed to load model: {str(e)}")
         logger.error(f"Error type: {type(e)}")
         logger.error(traceback.format_exc())
-        model = None  # Ensure model is None if loading fails
+        state["error"] = f"Failed to load model: {str(e)}"
+        return None  # Ensure model is None if loading fails
+
+# Optional INT8 quantization ("off", "static" or "dynamic"), only served if it agrees with the FP32 model
+QUANTIZE = os.getenv("QUANTIZE", "off").lower()
+QUANTIZE_DATA_DIR = os.getenv("QUANTIZE_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Dataset"))
+QUANTIZE_CALIBRATION_IMAGES = int(os.getenv("QUANTIZE_CALIBRATION_IMAGES", "100"))
+QUANTIZE_EVAL_IMAGES = int(os.getenv("QUANTIZE_EVAL_IMAGES", "50"))
+QUANTIZE_TOLERANCE = float(os.getenv("QUANTIZE_TOLERANCE", "0.05"))
+QUANTIZE_IOU = 0.5
+
+def quantization_image_split() -> Tuple[List[str], List[str]]:
+    """Split Dataset/ images into calibration and held-out lists (every 5th image is held out)"""
+    paths = sorted(str(path) for path in Path(QUANTIZE_DATA_DIR).rglob("*")
+                   if path.suffix.lower() in IMAGE_EXTENSIONS)
+    held_out = paths[::5][:QUANTIZE_EVAL_IMAGES]
+    calibration = [path for index, path in enumerate(paths) if index % 5][:QUANTIZE_CALIBRATION_IMAGES]
+    return calibration, held_out
+
+def letterbox_tensor(image: np.ndarray, size: int = INFERENCE_IMGSZ) -> np.ndarray:
+    """Resize and pad a BGR image the way YOLO does, returning a 1x3xHxW float32 RGB tensor"""
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top = (size - resized.shape[0]) // 2
+    left = (size - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+def build_quantized_model(base_model, calibration_paths: List[str]) -> str:
+    """Quantize the dynamic-batch ONNX export of the model to INT8 and return the quantized file's path"""
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+    
+    # Exports (or re-exports a fixed-batch leftover) so the quantized model keeps the dynamic batch axis
+    if batch_limit(load_backend("onnx", base_model)) == 1:
+        raise RuntimeError("ONNX export only accepts one image per call")
+    onnx_path = exported_artifacts["onnx"]
+    
+    quantized_path = f"{os.path.splitext(MODEL_PATH)[0]}_int8_{QUANTIZE}.onnx"
+    if os.path.exists(quantized_path) and os.path.getmtime(quantized_path) >= os.path.getmtime(onnx_path):
+        return quantized_path
+    
+    if QUANTIZE == "dynamic":
+        quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+    
+    if not calibration_paths:
+        raise RuntimeError(f"No calibration images found under {QUANTIZE_DATA_DIR}")
+    
+    class DatasetReader(CalibrationDataReader):
+        def __init__(self, input_name: str, paths: List[str]):
+            self.input_name = input_name
+            self.paths = iter(paths)
+        
+        def get_next(self):
+            for path in self.paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {self.input_name: letterbox_tensor(image)}
+            return None
+    
+    import onnxruntime
+    input_name = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    logger.info(f"Calibrating INT8 model on {len(calibration_paths)} images")
+    quantize_static(onnx_path, quantized_path, DatasetReader(input_name, calibration_paths),
+                    quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8, per_channel=True)
+    return quantized_path
+
+def box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """IoU between one xyxy box and an (N, 4) array of xyxy boxes"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / np.maximum(area + areas - intersection, 1e-9)
+
+def confident_predictions(checked_model, images: List[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """(xyxy, conf, cls) arrays above CONFIDENCE_THRESHOLD for a batch of images run in one call"""
+    predictions = []
+    for r in checked_model(images, imgsz=INFERENCE_IMGSZ, verbose=False):
+        xyxy, conf, cls = result_arrays(r)
+        keep = conf > CONFIDENCE_THRESHOLD
+        predictions.append((xyxy[keep], conf[keep], cls[keep]))
+    return predictions
+
+def compare_to_reference(reference_model, candidate_model, image_paths: List[str],
+                         batch_size: int = 1) -> Dict[str, Any]:
+    """Score a candidate model against the FP32 model's detections on held-out images, run batch_size at a time"""
+    images = [image for image in (cv2.imread(path) for path in image_paths) if image is not None]
+    images_compared = len(images)
+    top_class_matches = 0
+    reference_boxes = candidate_boxes = matched_boxes = 0
+    
+    pairs = []
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        pairs.extend(zip(confident_predictions(reference_model, chunk), confident_predictions(candidate_model, chunk)))
+    
+    for (ref_xyxy, ref_conf, ref_cls), (cand_xyxy, cand_conf, cand_cls) in pairs:
+        # The class of the most confident box is what the API reports first
+        ref_top = int(ref_cls[ref_conf.argmax()]) if len(ref_conf) else None
+        cand_top = int(cand_cls[cand_conf.argmax()]) if len(cand_conf) else None
+        top_class_matches += ref_top == cand_top
+        
+        # Greedily match same-class boxes at IoU >= 0.5, treating the FP32 boxes as ground truth
+        reference_boxes += len(ref_xyxy)
+        candidate_boxes += len(cand_xyxy)
+        unused = np.ones(len(cand_xyxy), dtype=bool)
+        for index in np.argsort(-ref_conf):
+            candidates = np.where(unused & (cand_cls == ref_cls[index]))[0]
+            if len(candidates) == 0:
+                continue
+            ious = box_iou(ref_xyxy[index], cand_xyxy[candidates])
+            if ious.max() >= QUANTIZE_IOU:
+                unused[candidates[ious.argmax()]] = False
+                matched_boxes += 1
+    
+    precision = matched_boxes / candidate_boxes if candidate_boxes else 1.0
+    recall = matched_boxes / reference_boxes if reference_boxes else 1.0
+    return {
+        "images_compared": images_compared,
+        "top_class_agreement": top_class_matches / images_compared if images_compared else 0.0,
+        "box_precision": precision,
+        "box_recall": recall,
+        "box_f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    }
+
+def quantize_with_guardrail(base_model, serving_model):
+    """Serve an INT8 model only if it stays within QUANTIZE_TOLERANCE of the FP32 model"""
+    calibration_paths, held_out_paths = quantization_image_split()
+    quantization = {"mode": QUANTIZE, "active": False, "tolerance": QUANTIZE_TOLERANCE}
+    backend_info["quantization"] = quantization
+    
+    missing = [package for package in ("onnx", "onnxruntime") if importlib_util.find_spec(package) is None]
+    if missing:
+        quantization["reason"] = f"QUANTIZE needs the optional packages {', '.join(missing)} (see README)"
+        logger.warning(f"Not quantizing: {quantization['reason']}")
+        return serving_model
+    if not held_out_paths:
+        quantization["reason"] = f"No held-out images found under {QUANTIZE_DATA_DIR}"
+        logger.warning(f"Not quantizing: {quantization['reason']}")
+        return serving_model
+    
+    quantized_path = build_quantized_model(base_model, calibration_paths)
+    from ultralytics import YOLO
+    quantized_model = YOLO(quantized_path, task="detect")
+    quantization["artifact"] = quantized_path
+    if not accepts_batches(quantized_model):
+        quantization["reason"] = "INT8 model only accepts one image per call"
+        logger.warning(f"Refusing INT8 model: {quantization['reason']}")
+        return serving_model
+    
+    # Validated at the batch size it will serve, since batched inputs are what a fixed-batch export broke
+    quantization["eval_batch_size"] = max(2, BATCH_SIZE)
+    metrics = compare_to_reference(base_model, quantized_model, held_out_paths, quantization["eval_batch_size"])
+    quantization.update(metrics)
+    
+    minimum = 1.0 - QUANTIZE_TOLERANCE
+    if metrics["images_compared"] == 0 or metrics["top_class_agreement"] < minimum or metrics["box_f1"] < minimum:
+        quantization["reason"] = "Accuracy dropped below tolerance"
+        logger.warning(f"Refusing INT8 model: top-class agreement {metrics['top_class_agreement']:.3f}, "
+                       f"box F1 {metrics['box_f1']:.3f}, required {minimum:.3f}")
+        return serving_model
+    
+    name = f"onnx-int8-{QUANTIZE}"
+    if BACKEND_BENCHMARK_RUNS > 0:
+        by_size = {size: benchmark_backend(quantized_model, batch_size=size) for size in served_batch_sizes()}
+        quantization["latency_ms"] = {str(size): latency_ms for size, latency_ms in by_size.items()}
+        score = float(np.mean(list(by_size.values())))
+        current = backend_info["benchmarks"].get(backend_info["name"])
+        if current is not None and score >= current:
+            quantization["reason"] = f"Not faster than {backend_info['name']} at the served batch sizes"
+            logger.warning(f"Refusing INT8 model: {score:.1f} ms per image vs {current:.1f} ms")
+            return serving_model
+        backend_info["latency_ms"] = by_size[1]
+        backend_info["benchmarks"][name] = score
+        backend_info.setdefault("batch_benchmarks", {})[name] = quantization["latency_ms"]
+    
+    quantization["active"] = True
+    backend_info["name"] = name
+    backend_info["artifact"] = quantized_path
+    backend_info["max_batch"] = batch_limit(quantized_model)
+    logger.info(f"Serving INT8 model {quantized_path} (top-class agreement "
+                f"{metrics['top_class_agreement']:.3f}, box F1 {metrics['box_f1']:.3f})")
+    return quantized_model
+
+# Loaded model versions kept in memory for instant rollback, counting the one serving traffic
+MODEL_REGISTRY_KEEP = int(os.getenv("MODEL_REGISTRY_KEEP", "2"))
+
+def model_version_name(path: str, source_sha: Optional[str]) -> str:
+    """Default version name: the weights' file name plus the start of their checksum"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{source_sha[:8]}" if source_sha else stem
+
+class ModelRegistry:
+    """Loaded model versions, the one serving traffic and an optional traffic split between them"""
+    
+    def __init__(self, keep: int = MODEL_REGISTRY_KEEP):
+        self.keep = max(1, keep)
+        # name -> version entry; load_base_model records its error, cache outcome and checksum in the entry
+        self._versions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.active: Optional[str] = None
+        self.split: Dict[str, float] = {}
+        self.swaps = 0
+    
+    def add(self, name: str, path: str, **fields) -> Dict[str, Any]:
+        """Register a version (loading unless fields say otherwise), replacing a failed one of the same name"""
+        with self._lock:
+            existing = self._versions.get(name)
+            if existing is not None and existing["state"] != "failed":
+                raise HTTPException(status_code=409, detail=f"Model version {name} is already {existing['state']}")
+            entry = {
+                "name": name, "path": os.path.abspath(path), "state": "loading", "error": None,
+                "source_sha256": None, "cache": None, "backend": "torch", "artifact": os.path.abspath(path),
+                "model": None, "started_at": time.time(), "load_seconds": None, "warmup_ms": None,
+                "activated_at": None, "requests": 0, "inference_seconds": 0.0, "detections": 0,
+            }
+            entry.update(fields)
+            self._versions[name] = entry
+            return entry
+    
+    def get(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._versions.get(name)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"Unknown model version {name}")
+        return entry
+    
+    def set_active(self, name: str):
+        """Make a loaded version the active one and return its model"""
+        with self._lock:
+            entry = self._versions.get(name)
+            if entry is None or entry["state"] != "ready":
+                raise HTTPException(status_code=409, detail=f"Model version {name} is not loaded")
+            if self.active is not None and self.active != name:
+                self.swaps += 1
+            self.active = name
+            entry["activated_at"] = time.time()
+            return entry["model"]
+    
+    def set_split(self, weights: Dict[str, float]):
+        """Send each request to a version with probability proportional to its weight ({} sends all to active)"""
+        with self._lock:
+            for name, weight in weights.items():
+                entry = self._versions.get(name)
+                if entry is None or entry["state"] != "ready":
+                    raise HTTPException(status_code=409, detail=f"Model version {name} is not loaded")
+                if weight <= 0:
+                    raise HTTPException(status_code=400, detail=f"Weight for {name} must be positive")
+            self.split = dict(weights)
+    
+    def remove(self, name: str):
+        with self._lock:
+            entry = self._versions.get(name)
+            if entry is None:
+                raise HTTPException(status_code=404, detail=f"Unknown model version {name}")
+            if name == self.active or name in self.split:
+                raise HTTPException(status_code=409, detail=f"Model version {name} is serving traffic")
+            if entry["state"] == "loading":
+                raise HTTPException(status_code=409, detail=f"Model version {name} is still loading")
+            del self._versions[name]
+    
+    def evict_extra(self) -> List[str]:
+        """Unload the oldest loaded versions beyond keep, never the active one or one in the split"""
+        with self._lock:
+            loaded = [entry for entry in self._versions.values() if entry["state"] == "ready"]
+            evictable = [entry for entry in loaded if entry["name"] != self.active and entry["name"] not in self.split]
+            evictable.sort(key=lambda entry: entry["activated_at"] or entry["started_at"])
+            evicted = [entry["name"] for entry in evictable[:max(0, len(loaded) - self.keep)]]
+            for name in evicted:
+                del self._versions[name]
+        return evicted
+    
+    def pick(self) -> Tuple[Optional[str], Any]:
+        """The version (and its model) that should serve the next request"""
+        with self._lock:
+            if self.split:
+                name = random.choices(list(self.split), weights=list(self.split.values()))[0]
+            else:
+                name = self.active
+            entry = self._versions.get(name) if name is not None else None
+            return name, entry["model"] if entry is not None else None
+    
+    def observe(self, name: Optional[str], inference_seconds: float, detections: int):
+        with self._lock:
+            entry = self._versions.get(name) if name is not None else None
+            if entry is not None:
+                entry["requests"] += 1
+                entry["inference_seconds"] += inference_seconds
+                entry["detections"] += detections
+    
+    def active_path(self) -> Optional[str]:
+        with self._lock:
+            entry = self._versions.get(self.active) if self.active is not None else None
+            return entry["path"] if entry is not None else None
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            versions = []
+            for entry in self._versions.values():
+                described = {key: value for key, value in entry.items() if key != "model"}
+                requests = entry["requests"]
+                described["mean_inference_ms"] = 1000 * entry["inference_seconds"] / requests if requests else None
+                described["mean_detections"] = entry["detections"] / requests if requests else None
+                versions.append(described)
+            return {
+                "active": self.active,
+                "split": self.split,
+                "keep": self.keep,
+                "swaps": self.swaps,
+                "versions": versions,
+            }
+
+model_registry = ModelRegistry()
+
+def activate_model_version(name: str):
+    """Serve a loaded version from now on; requests already running finish on the model they started with"""
+    global model
+    entry = model_registry.get(name)
+    if name == model_registry.active:
+        return
+    # Rebinding the global is atomic; every request path reads it once when it starts
+    model = model_registry.set_active(name)
+    backend_info.update(name=entry["backend"], artifact=entry["artifact"], latency_ms=entry["warmup_ms"],
+                        max_batch=batch_limit(model))
+    # Inference processes still hold the old model, so replace them
+    if inference_executor.kind == "process":
+        inference_executor.restart()
+    if model_worker_pool is not None and model_worker_pool.running:
+        model_worker_pool.restart()
+    logger.info(f"Now serving model version {name} ({entry['path']})")
+
+def load_model_version(name: str, path: str, activate: bool = False):
+    """Load and warm up a registered version in the background, then optionally switch traffic to it"""
+    entry = model_registry.get(name)
+    started = time.perf_counter()
+    loaded = load_base_model(path, entry)
+    if loaded is not None:
+        try:
+            entry["warmup_ms"] = benchmark_backend(loaded)
+        except Exception as e:
+            logger.error(f"Model version {name} failed its warm-up: {str(e)}")
+            entry["error"] = f"Warm-up failed: {str(e)}"
+            loaded = None
+    entry.update(model=loaded, state="ready" if loaded is not None else "failed",
+                 load_seconds=time.perf_counter() - started)
+    if loaded is None:
+        return
+    logger.info(f"Model version {name} loaded in {entry['load_seconds']:.1f}s "
+                f"({entry['warmup_ms']:.1f} ms per image)")
+    record_catalog_latency(path, entry["warmup_ms"])
+    
+    if activate:
+        activate_model_version(name)
+    for evicted in model_registry.evict_extra():
+        logger.info(f"Unloaded model version {evicted}")
+
+def load_model():
+    """Load and warm up the model, pick its backend and publish it as the global model"""
+    global model
+    model_state.update(state="loading", started_at=time.time())
+    started = time.perf_counter()
+    
+    try:
+        model_state["torch_threads"] = configure_torch_threads()
+    except ImportError:
+        pass  # load_base_model reports the missing dependency
+    base_model = load_base_model()
+    serving_model = base_model
+    if base_model is not None:
+        try:
+            serving_model = select_backend(base_model)
+        except Exception as e:
+            logger.error(f"Failed to select inference backend, keeping torch: {str(e)}")
+            logger.error(traceback.format_exc())
+            backend_info["name"] = "torch"
+            backend_info["artifact"] = MODEL_PATH
+        
+        if QUANTIZE in ("static", "dynamic"):
+            try:
+                serving_model = quantize_with_guardrail(base_model, serving_model)
+            except Exception as e:
+                logger.error(f"Failed to build quantized model, keeping {backend_info['name']}: {str(e)}")
+                logger.error(traceback.format_exc())
+                backend_info["quantization"] = {"mode": QUANTIZE, "active": False, "reason": str(e)}
+    del base_model
+    
+    if serving_model is not None:
+        name = model_version_name(MODEL_PATH, model_state["source_sha256"])
+        model_registry.add(name, MODEL_PATH, state="ready", model=serving_model, source_sha256=model_state["source_sha256"],
+                           cache=model_state["cache"], backend=backend_info["name"],
+                           artifact=os.path.abspath(backend_info["artifact"] or MODEL_PATH),
+                           warmup_ms=backend_info["latency_ms"], load_seconds=time.perf_counter() - started)
+        model_registry.set_active(name)
+    
+    model = serving_model
+    model_state.update(state="ready" if model is not None else "failed",
+                       load_seconds=time.perf_counter() - started)
+    model_load_done.set()
+    logger.info(f"Model load finished in {model_state['load_seconds']:.1f}s ({model_state['state']})")
+    
+    for backend, latency_ms in backend_info["benchmarks"].items():
+        if backend in BACKEND_NAMES:
+            record_catalog_latency(MODEL_PATH if backend == "torch" else exported_artifacts[backend], latency_ms)
+
+def load_model_in_background():
+    load_model()
+    # Model workers load the artifact the backend selection settled on, so they start after it
+    start_model_workers_if_ready()
+
+# Process-executor workers import this module too; they load the serving artifact in init_inference_process
+if MODEL_LOAD == "blocking" and multiprocessing.parent_process() is None:
+    load_model()
+
+@app.on_event("startup")
+async def start_model_load():
+    if MODEL_LOAD != "blocking":
+        threading.Thread(target=load_model_in_background, name="model-loader", daemon=True).start()
+
+async def wait_for_model(timeout: float = MODEL_WAIT_TIMEOUT):
+    """Hold a request until the background model load finishes, answering 503 if it fails or takes too long"""
+    deadline = time.monotonic() + timeout
+    while not model_load_done.is_set():
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=503, detail="Model is still loading, try again shortly",
+                                headers={"Retry-After": "5"})
+        await asyncio.sleep(0.05)
+    if model is None:
+        raise HTTPException(status_code=503, detail=model_state["error"] or "Model not loaded")
 
 # Load meanings database
-meanings_path = "meanings.csv"
+meanings_path = os.getenv("MEANINGS_PATH", "meanings.csv")
+MEANINGS_RELOAD_INTERVAL = float(os.getenv("MEANINGS_RELOAD_INTERVAL", "5"))
+
+class MeaningsIndex:
+    """Immutable case-insensitive lookup table compiled from meanings.csv"""
+    
+    def __init__(self, names: Tuple[str, ...], meanings: Dict[str, Dict[str, str]],
+                 mtime_ns: Optional[int] = None):
+        self.names = names
+        # language -> lowercase ornament name -> meaning
+        self.meanings = MappingProxyType({lang: MappingProxyType(table) for lang, table in meanings.items()})
+        self.mtime_ns = mtime_ns
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def lookup(self, ornament_name: str, lang: str) -> Optional[str]:
+        table = self.meanings.get(lang)
+        if table is None:
+            return None
+        return table.get(ornament_name.lower())
+
+def load_meanings_index(path: str) -> MeaningsIndex:
+    """Read meanings.csv and compile it into a per-language dict index"""
+    mtime_ns = os.stat(path).st_mtime_ns
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        columns = reader.fieldnames or []
+        rows = list(reader)
+    
+    names = []
+    meanings: Dict[str, Dict[str, str]] = {lang.value: {} for lang in Language if lang.value in columns}
+    for row in rows:
+        name = (row.get("name") or "").strip()
+        if not name:
+            continue
+        names.append(name)
+        for lang, table in meanings.items():
+            # Keep the first row for duplicate names, like the old DataFrame lookup did
+            if row.get(lang) and name.lower() not in table:
+                table[name.lower()] = row[lang]
+    return MeaningsIndex(tuple(names), meanings, mtime_ns)
+
 try:
-    meanings_df = pd.read_csv(meanings_path)
-    logger.info(f"Meanings database loaded with {len(meanings_df)} entries")
+    meanings_index = load_meanings_index(meanings_path)
+    logger.info(f"Meanings database loaded with {len(meanings_index)} entries")
 except Exception as e:
     logger.error(f"Failed to load meanings database: {str(e)}")
-    meanings_df = pd.DataFrame(columns=["name", "kg", "ru", "en"])
+    meanings_index = MeaningsIndex((), {})
+
+_meanings_reload_lock = threading.Lock()
+_meanings_checked_at = time.monotonic()
+
+def reload_meanings_if_changed() -> bool:
+    """Swap in a freshly compiled index if meanings.csv changed on disk; returns True if reloaded"""
+    global meanings_index, _meanings_checked_at
+    # Only one caller checks the file; everyone else keeps using the current index
+    if not _meanings_reload_lock.acquire(blocking=False):
+        return False
+    try:
+        _meanings_checked_at = time.monotonic()
+        try:
+            mtime_ns = os.stat(meanings_path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime_ns == meanings_index.mtime_ns:
+            return False
+        try:
+            new_index = load_meanings_index(meanings_path)
+        except Exception as e:
+            logger.error(f"Failed to reload meanings database, keeping previous version: {str(e)}")
+            return False
+        meanings_index = new_index
+        logger.info(f"Meanings database reloaded with {len(new_index)} entries")
+        return True
+    finally:
+        _meanings_reload_lock.release()
 
 # Create static directory for uploaded images
 static_dir = "static"
@@ -121,91 +1232,1248 @@ os.makedirs(uploads_dir, exist_ok=True)
 # Mount static files directory
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
+# Lazily encoded crops: detections carry a /crops/{id} URL and the crop is cut and encoded on first fetch
+CROP_FORMAT = os.getenv("CROP_FORMAT", "jpg").lower()  # "jpg" or "webp"
+CROP_QUALITY = int(os.getenv("CROP_QUALITY", "90"))
+CROP_ENCODE_WORKERS = int(os.getenv("CROP_ENCODE_WORKERS", "4"))
+CROP_STORE_SOURCES = os.getenv("CROP_STORE_SOURCES", "true").lower() in ("1", "true", "yes")
+# A crop URL may be fetched from any server worker, and only the one that ran the detection has the frame in memory,
+# so with several workers every source goes to crop_sources/ right away
+CROP_SOURCES_IN_MEMORY = SERVER_WORKERS == 1
+FRAME_CACHE_MAX_BYTES = int(os.getenv("FRAME_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+FRAME_CACHE_TTL_SECONDS = float(os.getenv("FRAME_CACHE_TTL_SECONDS", "120"))
+CROP_MEDIA_TYPES = {"jpg": "image/jpeg", "webp": "image/webp"}
+CROP_ID_PATTERN = re.compile(r"^([0-9a-f]{32})_(\d+)_(\d+)_(\d+)_(\d+)$")
+
+# Uploaded images that produced detections, kept so crops can be rendered after the frame cache drops them
+crop_sources_dir = "crop_sources"
+os.makedirs(crop_sources_dir, exist_ok=True)
+
+class FrameCache:
+    """Short-lived in-memory cache of decoded frames that crops are cut from
+
+    A frame can carry its encoded source and the crops not rendered yet. If it is evicted while some are still
+    pending, spill(frame_id, frame, source) is called (outside the lock) to persist what they need.
+    """
+    
+    def __init__(self, max_bytes: int = FRAME_CACHE_MAX_BYTES, ttl_seconds: float = FRAME_CACHE_TTL_SECONDS,
+                 spill: Optional[Callable[[str, np.ndarray, Optional[bytes]], None]] = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill = spill
+        self._frames: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        # frame_id -> (encoded source or None, crop ids not rendered yet)
+        self._pending: Dict[str, Tuple[Optional[bytes], Set[str]]] = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.spilled = 0
+    
+    def put(self, frame_id: str, frame: np.ndarray):
+        if frame.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            spills = self._drop_locked(frame_id) if frame_id in self._frames else []
+            self._frames[frame_id] = (time.time(), frame)
+            self.current_bytes += frame.nbytes
+            spills += self._evict_locked()
+        self._spill(spills)
+    
+    def attach_source(self, frame_id: str, source: Optional[bytes], crop_ids: List[str]) -> bool:
+        """Hold a cached frame's source until its crops are rendered; False if the frame isn't cached"""
+        with self._lock:
+            if frame_id not in self._frames:
+                return False
+            self._pending[frame_id] = (source, set(crop_ids))
+            self.current_bytes += len(source or b"")
+            spills = self._evict_locked()
+        self._spill(spills)
+        return True
+    
+    def crop_rendered(self, frame_id: str, crop_id: str):
+        """Forget a pending crop; once none is left the frame's source isn't needed anymore"""
+        with self._lock:
+            entry = self._pending.get(frame_id)
+            if entry is None:
+                return
+            entry[1].discard(crop_id)
+            if not entry[1]:
+                del self._pending[frame_id]
+                self.current_bytes -= len(entry[0] or b"")
+    
+    def contains(self, frame_id: str) -> bool:
+        """Whether the frame is still cached, without counting a hit or miss"""
+        with self._lock:
+            spills = self._evict_locked()
+            found = frame_id in self._frames
+        self._spill(spills)
+        return found
+    
+    def get(self, frame_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            spills = self._evict_locked()
+            entry = self._frames.get(frame_id)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        self._spill(spills)
+        return entry[1] if entry is not None else None
+    
+    def spill_all(self):
+        """Persist every frame that still has pending crops (at shutdown)"""
+        with self._lock:
+            spills = [spill for frame_id in list(self._frames) for spill in self._drop_locked(frame_id)]
+        self._spill(spills)
+    
+    def _drop_locked(self, frame_id: str) -> List[Tuple[str, np.ndarray, Optional[bytes]]]:
+        _, frame = self._frames.pop(frame_id)
+        self.current_bytes -= frame.nbytes
+        entry = self._pending.pop(frame_id, None)
+        if entry is None:
+            return []
+        self.current_bytes -= len(entry[0] or b"")
+        return [(frame_id, frame, entry[0])]
+    
+    def _evict_locked(self) -> List[Tuple[str, np.ndarray, Optional[bytes]]]:
+        # Frames are inserted in time order, so expired and over-budget frames are always at the front
+        now = time.time()
+        spills = []
+        while self._frames:
+            frame_id, (stored_at, _) = next(iter(self._frames.items()))
+            if self.current_bytes <= self.max_bytes and now - stored_at <= self.ttl_seconds:
+                break
+            spills += self._drop_locked(frame_id)
+        return spills
+    
+    def _spill(self, spills: List[Tuple[str, np.ndarray, Optional[bytes]]]):
+        if not spills or self.spill is None:
+            return
+        with self._lock:
+            self.spilled += len(spills)
+        for frame_id, frame, source in spills:
+            try:
+                self.spill(frame_id, frame, source)
+            except Exception as e:
+                logger.error(f"Failed to keep the source of frame {frame_id}: {str(e)}")
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "frames": len(self._frames),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "pending_sources": len(self._pending),
+                "spilled": self.spilled,
+            }
+
+# Budget for everything written to static/uploads/ and crop_sources/, enforced by a background task
+CROP_STORE_MAX_BYTES = int(os.getenv("CROP_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+CROP_STORE_MAX_FILES = int(os.getenv("CROP_STORE_MAX_FILES", "20000"))
+CROP_STORE_MAX_AGE_SECONDS = float(os.getenv("CROP_STORE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))  # 0 = no limit
+CROP_STORE_GC_INTERVAL = float(os.getenv("CROP_STORE_GC_INTERVAL", "60"))
+
+class CropStore:
+    """Tracks crop and source files on disk and evicts the least recently used ones over budget"""
+    
+    def __init__(self, directories: List[str], max_bytes: int = CROP_STORE_MAX_BYTES,
+                 max_files: int = CROP_STORE_MAX_FILES, max_age_seconds: float = CROP_STORE_MAX_AGE_SECONDS):
+        self.directories = directories
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_age_seconds = max_age_seconds
+        # path -> (size, last access time); insertion order is kept as LRU order
+        self._files: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.expired_files = 0
+        self.orphans_removed = 0
+        self.gc_runs = 0
+        self.last_gc_at: Optional[float] = None
+        self.last_gc_seconds: Optional[float] = None
+    
+    def record(self, path: str, size: int):
+        """Register a newly written file"""
+        with self._lock:
+            if path in self._files:
+                self.current_bytes -= self._files.pop(path)[0]
+            self._files[path] = (size, time.time())
+            self.current_bytes += size
+    
+    def touch(self, path: str):
+        """Mark a file as recently used so it is evicted last"""
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None:
+                self._files[path] = (entry[0], time.time())
+                self._files.move_to_end(path)
+    
+    def reconcile(self):
+        """Rebuild the index from disk at startup and delete leftovers of interrupted writes"""
+        found = []
+        for directory in self.directories:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    if entry.name.endswith(".tmp") or entry.stat().st_size == 0:
+                        # Partial writes from a crash, never referenced by any response
+                        try:
+                            os.unlink(entry.path)
+                            self.orphans_removed += 1
+                        except OSError as e:
+                            logger.warning(f"Failed to remove orphaned file {entry.path}: {str(e)}")
+                        continue
+                    stat = entry.stat()
+                    found.append((max(stat.st_atime, stat.st_mtime), entry.path, stat.st_size))
+        
+        with self._lock:
+            self._files.clear()
+            self.current_bytes = 0
+            for last_access, path, size in sorted(found):
+                self._files[path] = (size, last_access)
+                self.current_bytes += size
+        logger.info(f"Crop store holds {len(found)} files ({self.current_bytes} bytes), "
+                    f"removed {self.orphans_removed} orphaned files")
+    
+    def collect_garbage(self):
+        """Delete expired files, then least recently used files until the store is within budget"""
+        started = time.perf_counter()
+        now = time.time()
+        doomed = []
+        with self._lock:
+            while self._files:
+                path, (size, last_access) = next(iter(self._files.items()))
+                expired = self.max_age_seconds > 0 and now - last_access > self.max_age_seconds
+                over_budget = self.current_bytes > self.max_bytes or len(self._files) > self.max_files
+                if not expired and not over_budget:
+                    break
+                self._files.popitem(last=False)
+                self.current_bytes -= size
+                if expired:
+                    self.expired_files += 1
+                else:
+                    self.evicted_files += 1
+                self.evicted_bytes += size
+                doomed.append(path)
+        
+        for path in doomed:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to evict {path}: {str(e)}")
+        
+        self.gc_runs += 1
+        self.last_gc_at = now
+        self.last_gc_seconds = time.perf_counter() - started
+        if doomed:
+            logger.info(f"Crop store evicted {len(doomed)} files")
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "bytes": self.current_bytes,
+                "max_files": self.max_files,
+                "max_bytes": self.max_bytes,
+                "max_age_seconds": self.max_age_seconds,
+                "evicted_files": self.evicted_files,
+                "evicted_bytes": self.evicted_bytes,
+                "expired_files": self.expired_files,
+                "orphans_removed": self.orphans_removed,
+                "gc_runs": self.gc_runs,
+                "last_gc_at": self.last_gc_at,
+                "last_gc_seconds": self.last_gc_seconds,
+            }
+
+def write_crop_source(frame_id: str, frame: np.ndarray, source: Optional[bytes]):
+    """Write a frame's source to disk, encoding the frame if there is none"""
+    data = source
+    if data is None:
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        if not ok:
+            return
+        data = encoded.tobytes()
+    store_crop_source(frame_id, data)
+
+def spill_crop_source(frame_id: str, frame: np.ndarray, source: Optional[bytes]):
+    """Write an evicted frame's source to disk in the background"""
+    crop_executor.submit(write_crop_source, frame_id, frame, source)
+
+frame_cache = FrameCache(spill=spill_crop_source)
+crop_store = CropStore([uploads_dir, crop_sources_dir])
+crop_executor = ThreadPoolExecutor(max_workers=max(1, CROP_ENCODE_WORKERS), thread_name_prefix="crop-encode")
+
+def crop_id_for(frame_id: str, bbox: List[float]) -> str:
+    x1, y1, x2, y2 = (max(0, int(value)) for value in bbox)
+    return f"{frame_id}_{x1}_{y1}_{x2}_{y2}"
+
+def store_crop_source(frame_id: str, source) -> None:
+    """Keep the encoded upload (bytes or a file object) so crops can be rendered later"""
+    if not CROP_STORE_SOURCES:
+        return
+    path = os.path.join(crop_sources_dir, f"{frame_id}.img")
+    if isinstance(source, (bytes, bytearray)):
+        with open(path, "wb") as f:
+            f.write(source)
+    else:
+        source.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(source, f)
+    crop_store.record(path, os.path.getsize(path))
+
+def crop_ids_of(detections: List[Dict[str, Any]]) -> List[str]:
+    return [detection["cropped_image"].rsplit("/", 1)[-1] for detection in detections]
+
+def keep_crop_source(frame_id: str, source, detections: List[Dict[str, Any]], scale: int = 1):
+    """Make sure crops of these detections can be rendered after the frame leaves the frame cache
+
+    A full-size cached frame keeps its (small enough) upload in memory, written to disk only if it is evicted
+    before all its crops were rendered. Reduced decodes, uncached frames, large uploads and every upload when
+    there are several server workers are written right away.
+    """
+    if not CROP_STORE_SOURCES or not detections:
+        return
+    if scale == 1 and CROP_SOURCES_IN_MEMORY:
+        data = source
+        if not isinstance(source, (bytes, bytearray)):
+            source.seek(0, os.SEEK_END)
+            data = None
+            if source.tell() <= UPLOAD_MEMORY_LIMIT:
+                source.seek(0)
+                data = source.read()
+        if data is not None and frame_cache.attach_source(frame_id, bytes(data), crop_ids_of(detections)):
+            return
+    store_crop_source(frame_id, source)
+
+def crop_available(url: str) -> bool:
+    """Whether a /crops/ URL can still be served: already encoded, or its frame is cached or stored"""
+    crop_id = url.rsplit("/", 1)[-1]
+    match = CROP_ID_PATTERN.match(crop_id)
+    if match is None:
+        return False
+    if os.path.exists(os.path.join(uploads_dir, f"{crop_id}.{CROP_FORMAT}")):
+        return True
+    frame_id = match.group(1)
+    return frame_cache.contains(frame_id) or os.path.exists(os.path.join(crop_sources_dir, f"{frame_id}.img"))
+
+def render_crop(crop_id: str) -> Optional[str]:
+    """Cut and encode a crop on first use, returning the encoded file's path (None if its frame is gone)"""
+    match = CROP_ID_PATTERN.match(crop_id)
+    if match is None:
+        return None
+    crop_path = os.path.join(uploads_dir, f"{crop_id}.{CROP_FORMAT}")
+    if os.path.exists(crop_path):
+        crop_store.touch(crop_path)
+        return crop_path
+    
+    frame_id = match.group(1)
+    x1, y1, x2, y2 = (int(value) for value in match.groups()[1:])
+    frame = frame_cache.get(frame_id)
+    if frame is None:
+        source_path = os.path.join(crop_sources_dir, f"{frame_id}.img")
+        if os.path.exists(source_path):
+            with metrics.time("decode"):
+                frame = cv2.imread(source_path)
+            crop_store.touch(source_path)
+    if frame is None:
+        return None
+    
+    cropped = frame[y1:y2, x1:x2]
+    if cropped.size == 0:
+        return None
+    
+    with metrics.time("crop_encode"):
+        if CROP_FORMAT == "webp":
+            ok, encoded = cv2.imencode(".webp", cropped, [cv2.IMWRITE_WEBP_QUALITY, CROP_QUALITY])
+        else:
+            ok, encoded = cv2.imencode(".jpg", cropped, [cv2.IMWRITE_JPEG_QUALITY, CROP_QUALITY])
+    if not ok:
+        raise RuntimeError(f"Failed to encode crop {crop_id}")
+    
+    # Write under a temporary name so concurrent fetches never see a partial file
+    temp_path = f"{crop_path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(encoded.tobytes())
+    os.replace(temp_path, crop_path)
+    crop_store.record(crop_path, len(encoded))
+    frame_cache.crop_rendered(frame_id, crop_id)
+    return crop_path
+
+async def crop_store_gc_loop():
+    """Background task keeping the crop store within its budget"""
+    while True:
+        await asyncio.sleep(CROP_STORE_GC_INTERVAL)
+        try:
+            await run_in_threadpool(crop_store.collect_garbage)
+        except Exception as e:
+            logger.error(f"Crop store garbage collection failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_crop_store():
+    await run_in_threadpool(crop_store.reconcile)
+    await run_in_threadpool(crop_store.collect_garbage)
+    app.state.crop_store_gc = asyncio.create_task(crop_store_gc_loop())
+
+@app.on_event("shutdown")
+async def stop_crop_store():
+    task = getattr(app.state, "crop_store_gc", None)
+    if task is not None:
+        task.cancel()
+    # Frames whose crops were never fetched still need their sources after a restart
+    frame_cache.spill_all()
+    crop_executor.shutdown(wait=True)
+
+def extract_detections(results, original_image: np.ndarray, frame_id: Optional[str] = None,
+                       scale: int = 1, cache_frame: bool = True) -> Dict[str, Any]:
+    """Turn YOLO results for one image into per-class best detections with crop URLs"""
+    names = results[0].names if len(results) else None
+    return detections_from_arrays([result_arrays(r) for r in results], original_image, frame_id, scale, names,
+                                  cache_frame)
+
+def detections_from_arrays(box_arrays: List[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+                           original_image: np.ndarray, frame_id: Optional[str] = None,
+                           scale: int = 1, names: Optional[Dict[int, str]] = None,
+                           cache_frame: bool = True) -> Dict[str, Any]:
+    """Turn (xyxy, conf, cls) box arrays for one image into per-class best detections with crop URLs
+
+    scale is the reduction the image was decoded at; boxes are mapped back to full-resolution coordinates.
+    names are the class names of the model that produced the boxes (the serving model's by default).
+    Without cache_frame the caller keeps the frame for its crops itself.
+    """
+    names = model.names if names is None else names
+    if box_arrays:
+        xyxy = np.concatenate([arrays[0] for arrays in box_arrays]).reshape(-1, 4)
+        confs = np.concatenate([arrays[1] for arrays in box_arrays])
+        classes = np.concatenate([arrays[2] for arrays in box_arrays]).astype(np.int64)
+    else:
+        xyxy = np.zeros((0, 4), dtype=np.float32)
+        confs = np.zeros(0, dtype=np.float32)
+        classes = np.zeros(0, dtype=np.int64)
+    
+    keep = confs > CONFIDENCE_THRESHOLD
+    xyxy, confs, classes = xyxy[keep], confs[keep], classes[keep]
+    
+    # Best box per class: sort by class then descending confidence (stable, so the earliest box wins ties)
+    order = np.lexsort((-confs, classes))
+    first_of_class = np.ones(len(order), dtype=bool)
+    first_of_class[1:] = classes[order][1:] != classes[order][:-1]
+    best = order[first_of_class]
+    # Report classes in the order they first appear among the detections
+    _, first_seen = np.unique(classes, return_index=True)
+    best = best[np.argsort(first_seen)]
+    
+    # Only the unique detections become Python objects
+    best_xyxy = xyxy[best] * scale if scale != 1 else xyxy[best]
+    unique_detections = [
+        {"class": names[cls], "confidence": conf, "bbox": bbox}
+        for cls, conf, bbox in zip(classes[best].tolist(), confs[best].tolist(), best_xyxy.tolist())
+    ]
+    
+    # Crops are only encoded when a client fetches them; keep the frame around for that
+    if unique_detections:
+        frame_id = frame_id or uuid.uuid4().hex
+        if scale == 1 and cache_frame:
+            # A reduced decode is too small to crop from; those crops are cut from the stored full-size source
+            frame_cache.put(frame_id, original_image)
+        for detection in unique_detections:
+            detection["cropped_image"] = f"/crops/{crop_id_for(frame_id, detection['bbox'])}"
+    
+    # Log all detections and the filtered unique ones
+    logger.info(f"Found {len(confs)} total detections")
+    logger.info(f"Found {len(unique_detections)} unique ornament types")
+    
+    return {
+        "detections": unique_detections,
+        "all_detections_count": len(confs)
+    }
+
+def should_tile(image: np.ndarray, tiled: Optional[bool] = None) -> bool:
+    """Whether an image goes through tiled inference (an explicit request wins over TILING)"""
+    height, width = image.shape[:2]
+    return should_tile_size(width, height, tiled)
+
+def should_tile_size(width: int, height: int, tiled: Optional[bool] = None) -> bool:
+    """should_tile for an image that is not decoded yet"""
+    if tiled is not None:
+        return tiled
+    if TILING == "always":
+        return True
+    if TILING == "auto":
+        return height * width > TILE_AUTO_MEGAPIXELS * 1_000_000
+    return False
+
+def tile_origins(length: int) -> List[int]:
+    """Start offsets of overlapping tiles along one axis, with the last tile flush to the edge"""
+    if length <= TILE_SIZE:
+        return [0]
+    stride = max(1, int(TILE_SIZE * (1 - TILE_OVERLAP)))
+    origins = list(range(0, length - TILE_SIZE, stride))
+    origins.append(length - TILE_SIZE)
+    return origins
+
+def image_tiles(image: np.ndarray) -> List[Tuple[int, int, np.ndarray]]:
+    """Split an image into overlapping (x, y, tile view) tiles, plus the whole image if configured"""
+    height, width = image.shape[:2]
+    tiles = [(x, y, image[y:y + TILE_SIZE, x:x + TILE_SIZE])
+             for y in tile_origins(height) for x in tile_origins(width)]
+    if TILE_INCLUDE_FULL_IMAGE and len(tiles) > 1:
+        # The downscaled full view still catches ornaments larger than a tile
+        tiles.append((0, 0, image))
+    return tiles
+
+def merge_tile_arrays(tile_arrays: List[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+                      offsets: List[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Shift per-tile boxes into full-image coordinates and drop cross-tile duplicates with per-class NMS"""
+    boxes, scores, classes = [], [], []
+    for (xyxy, conf, cls), (x, y) in zip(tile_arrays, offsets):
+        keep = conf > CONFIDENCE_THRESHOLD
+        boxes.append(xyxy[keep] + np.array([x, y, x, y], dtype=xyxy.dtype))
+        scores.append(conf[keep])
+        classes.append(cls[keep])
+    
+    boxes = np.concatenate(boxes) if boxes else np.zeros((0, 4), dtype=np.float32)
+    scores = np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+    classes = np.concatenate(classes) if classes else np.zeros(0, dtype=np.float32)
+    if len(boxes) == 0:
+        return boxes, scores, classes
+    
+    import torch
+    from torchvision.ops import batched_nms
+    keep = batched_nms(torch.from_numpy(boxes).float(), torch.from_numpy(scores).float(),
+                       torch.from_numpy(classes).long(), TILE_NMS_IOU).numpy()
+    return boxes[keep], scores[keep], classes[keep]
+
+def run_tiled_inference(image: np.ndarray, detector=None) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Run overlapping tiles through the model in batches and merge them into one set of box arrays"""
+    detector = model if detector is None else detector
+    tiles = image_tiles(image)
+    logger.info(f"Running tiled inference on {image.shape[1]}x{image.shape[0]} image with {len(tiles)} tiles")
+    
+    tile_arrays = []
+    step = batch_limit(detector)
+    for start in range(0, len(tiles), step):
+        chunk = tiles[start:start + step]
+        results = detector([tile for _, _, tile in chunk], imgsz=INFERENCE_IMGSZ)
+        tile_arrays.extend(result_arrays(r) for r in results)
+    return [merge_tile_arrays(tile_arrays, [(x, y) for x, y, _ in tiles])]
+
 def process_image(image_path: str) -> Dict[str, Any]:
-    """Process an image with YOLOv8 model and return detections"""
-    if model is None:
+    """Process an image file with YOLOv8 model and return detections"""
+    scale = decode_scale_for(image_path)
+    original_image = cv2.imread(image_path, REDUCED_DECODE_FLAGS.get(scale, cv2.IMREAD_COLOR))
+    if original_image is None:
+        raise HTTPException(status_code=400, detail="Could not read image")
+    
+    logger.info(f"Processing image: {image_path}")
+    frame_id = uuid.uuid4().hex
+    result = process_decoded_image(original_image, frame_id, scale=scale)
+    if result["detections"]:
+        with open(image_path, "rb") as source:
+            keep_crop_source(frame_id, source, result["detections"], scale)
+    return result
+
+def process_decoded_image(original_image: np.ndarray, frame_id: Optional[str] = None,
+                          tiled: Optional[bool] = None, scale: int = 1, detector=None) -> Dict[str, Any]:
+    """Process an already decoded BGR image with YOLOv8 model and return detections
+
+    detector is the model to use (the serving model by default), read once so a model swap can't split a request.
+    The result carries the stage durations under "timings" (it may come back from another process).
+    """
+    detector = model if detector is None else detector
+    if detector is None:
         error_msg = "Model not loaded"
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
     
     try:
-        # Read the original image
-        original_image = cv2.imread(image_path)
-        if original_image is None:
-            raise HTTPException(status_code=400, detail="Could not read image")
-        
-        # Run inference
-        logger.info(f"Processing image: {image_path}")
-        results = model(image_path)
-        
-        # Process results
-        all_detections = []
-        unique_classes = {}  # To keep track of best detection for each class
-        
-        for r in results:
-            boxes = r.boxes
-            for box in boxes:
-                conf = box.conf.item()
-                if conf > 0.25:  # Confidence threshold
-                    cls = int(box.cls.item())
-                    cls_name = model.names[cls]
-                    bbox = box.xyxy.tolist()[0]  # Convert to list
-                    
-                    # Crop the image
-                    x1, y1, x2, y2 = map(int, bbox)
-                    cropped = original_image[y1:y2, x1:x2]
-                    
-                    # Save cropped image to static folder
-                    cropped_filename = f"{cls_name}_{uuid.uuid4()}.jpg"
-                    cropped_path = os.path.join(uploads_dir, cropped_filename)
-                    cv2.imwrite(cropped_path, cropped)
-                    
-                    detection = {
-                        "class": cls_name,
-                        "confidence": conf,
-                        "bbox": bbox,
-                        "cropped_image": f"/static/uploads/{cropped_filename}"
-                    }
-                    
-                    all_detections.append(detection)
-                    
-                    # Keep only the best confidence detection for each class
-                    if cls_name not in unique_classes or conf > unique_classes[cls_name]["confidence"]:
-                        unique_classes[cls_name] = detection
-        
-        # Convert unique classes dict to list
-        unique_detections = list(unique_classes.values())
-        
-        # Log all detections and the filtered unique ones
-        logger.info(f"Found {len(all_detections)} total detections")
-        logger.info(f"Found {len(unique_detections)} unique ornament types")
+        timings: Dict[str, float] = {}
+        # Large photos are split into tiles so small repeated ornaments survive the downscale
+        if should_tile(original_image, tiled):
+            with timed_stage(timings, "inference"):
+                box_arrays = run_tiled_inference(original_image, detector)
+            with timed_stage(timings, "postprocess"):
+                result = detections_from_arrays(box_arrays, original_image, frame_id, scale, detector.names)
+        else:
+            # Run inference on the same array that is used for cropping
+            with timed_stage(timings, "inference"):
+                results = detector(original_image, imgsz=INFERENCE_IMGSZ)
+            with timed_stage(timings, "postprocess"):
+                result = extract_detections(results, original_image, frame_id, scale)
         
-        return {
-            "detections": unique_detections,
-            "all_detections_count": len(all_detections)
-        }
+        result["timings"] = timings
+        return result
     except Exception as e:
         logger.error(f"Error in process_image: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
-def get_ornament_meaning(ornament_name: str, lang: Language = Language.ENGLISH) -> Optional[str]:
-    """Get the meaning of an ornament in the specified language"""
-    # Make the search case-insensitive
-    ornament_name = ornament_name.lower()
+def process_batch(images: List[np.ndarray], batch_size: int = BATCH_SIZE,
+                  frame_ids: Optional[List[str]] = None, scales: Optional[List[int]] = None,
+                  cache_frames: bool = True) -> List[Dict[str, Any]]:
+    """Run decoded BGR images through the model in batches of batch_size
+
+    Each result carries its stage durations under "timings"; a batch's inference time is split evenly over its images.
+    Without cache_frames the caller keeps the frames for its crops itself (see extract_detections).
+    """
+    detector = model
+    if detector is None:
+        error_msg = "Model not loaded"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+    
+    try:
+        processed = []
+        batch_size = min(batch_size, batch_limit(detector))
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            chunk_frame_ids = frame_ids[start:start + batch_size] if frame_ids else [None] * len(chunk)
+            chunk_scales = scales[start:start + batch_size] if scales else [1] * len(chunk)
+            logger.info(f"Running batch of {len(chunk)} images ({start + 1}-{start + len(chunk)} of {len(images)})")
+            
+            # A list of arrays is stacked into a single tensor batch by ultralytics
+            started = time.perf_counter()
+            results = detector(chunk, imgsz=INFERENCE_IMGSZ)
+            inference_share = (time.perf_counter() - started) / len(chunk)
+            for image, frame_id, scale, r in zip(chunk, chunk_frame_ids, chunk_scales, results):
+                timings = {"inference": inference_share}
+                with timed_stage(timings, "postprocess"):
+                    result = extract_detections([r], image, frame_id, scale, cache_frames)
+                result["timings"] = timings
+                processed.append(result)
+        
+        return processed
+    except Exception as e:
+        logger.error(f"Error in process_batch: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
+
+def model_identity() -> str:
+    """Identify the model weights on disk, so cached results are dropped when they change"""
+    try:
+        path = model_registry.active_path() or MODEL_PATH
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{backend_info['name']}"
+    except OSError:
+        return f"{os.path.abspath(path)}:missing"
+
+class DetectionCache:
+    """Content-addressed LRU/TTL cache of detection results, bounded by serialized size"""
+    
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (stored_at, serialized result); stored as JSON so hits can't be mutated by callers
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._model_identity = model_identity()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.crops_gone = 0
+    
+    def key_for(self, data: bytes, variant: str = "") -> str:
+        """Cache key for raw image bytes under the current model, threshold and processing variant"""
+        return f"{hashlib.sha256(data).hexdigest()}:{model_identity()}:{CONFIDENCE_THRESHOLD}:{variant}"
+    
+    def key_for_file(self, fileobj, variant: str = "") -> str:
+        """Cache key for a file-like upload, hashed in chunks and rewound afterwards"""
+        digest = hashlib.sha256()
+        fileobj.seek(0)
+        for chunk in iter(lambda: fileobj.read(1024 * 1024), b""):
+            digest.update(chunk)
+        fileobj.seek(0)
+        return f"{digest.hexdigest()}:{model_identity()}:{CONFIDENCE_THRESHOLD}:{variant}"
+    
+    def _check_model(self):
+        identity = model_identity()
+        if identity != self._model_identity:
+            logger.info("Model weights changed, invalidating detection cache")
+            self._clear_locked()
+            self._model_identity = identity
+            self.invalidations += 1
+    
+    def _clear_locked(self):
+        self._entries.clear()
+        self.current_bytes = 0
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._check_model()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, payload = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.current_bytes -= len(payload)
+                self.expirations += 1
+                self.misses += 1
+                return None
+        result = json.loads(payload)
+        # The frame cache and crop store keep frames for less time than this cache keeps results
+        if not all(crop_available(detection["cropped_image"]) for detection in result.get("detections", [])):
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    self.current_bytes -= len(payload)
+                self.crops_gone += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return result
+    
+    def put(self, key: str, result: Dict[str, Any]):
+        payload = json.dumps(result)
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            self._check_model()
+            if key in self._entries:
+                self.current_bytes -= len(self._entries.pop(key)[1])
+            self._entries[key] = (time.time(), payload)
+            self.current_bytes += len(payload)
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+    
+    def invalidate(self):
+        with self._lock:
+            self._clear_locked()
+            self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "crops_gone": self.crops_gone,
+                "model_identity": self._model_identity,
+            }
+
+detection_cache: Optional[DetectionCache] = DetectionCache() if CACHE_ENABLED else None
+
+def cache_variant(tiled: Optional[bool]) -> str:
+    """Processing variant of a detection-cache key; batches never tile, so they share the tiled=False entries"""
+    return f"tiled={tiled}"
+
+def cacheable_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """The language-independent part of a detection result that is worth caching"""
+    return {
+        "detections": result["detections"],
+        "all_detections_count": result["all_detections_count"],
+    }
+
+class InferenceExecutor:
+    """Bounded thread or process pool for running blocking inference off the event loop"""
+    
+    def __init__(self, kind: str = INFERENCE_EXECUTOR, workers: int = INFERENCE_WORKERS,
+                 max_pending: int = INFERENCE_MAX_PENDING):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self._pool = self._new_pool()
+        # Counters are only touched from the event loop thread, so no lock is needed
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.broken_pools = 0
+    
+    def _new_pool(self):
+        if self.kind == "process":
+            # Created on first use, once the serving artifact is known. Workers are spawned and load it themselves:
+            # a child forked after torch ran multi-threaded work deadlocks in its first forward pass
+            if model is None:
+                return None
+            threads = max(1, available_cpus() // SERVER_WORKERS // self.workers)
+            return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=init_inference_process,
+                                       initargs=(backend_info["artifact"] or MODEL_PATH, batch_limit(model), threads))
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+    
+    def restart(self):
+        """Start fresh worker processes after a model swap; calls already submitted finish on the old ones"""
+        if self.kind != "process":
+            return
+        old_pool, self._pool = self._pool, None
+        if old_pool is not None:
+            old_pool.shutdown(wait=False)
+    
+    @asynccontextmanager
+    async def slot(self):
+        """Count one inference call as in flight, rejecting with 503 once max_pending calls are"""
+        if self.in_flight >= self.max_pending:
+            self.rejected += 1
+            logger.warning(f"Inference pool saturated ({self.in_flight} in flight), rejecting request")
+            raise HTTPException(status_code=503, detail="Inference pool is saturated, try again later")
+        
+        self.in_flight += 1
+        try:
+            yield
+            self.completed += 1
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+    
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool, rejecting with 503 once max_pending calls are in flight"""
+        async with self.slot():
+            if self._pool is None:
+                self._pool = self._new_pool()
+                if self._pool is None:
+                    raise HTTPException(status_code=503, detail="Model is not loaded")
+            pool = self._pool
+            try:
+                return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+            except BrokenProcessPool:
+                # A worker died (OOM kill, segfault); every later submit would fail too, so start a new pool.
+                # Calls that were queued on the same pool land here as well but only the first replaces it
+                if self._pool is pool:
+                    self.broken_pools += 1
+                    logger.error("Inference worker process died, restarting the process pool")
+                    self.restart()
+                raise HTTPException(status_code=503, detail="Inference worker crashed, try again")
+    
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "active": min(self.in_flight, self.workers),
+            "queued": max(0, self.in_flight - self.workers),
+            "saturated": self.in_flight >= self.max_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "broken_pools": self.broken_pools,
+        }
+
+def init_inference_process(artifact: str, max_batch: int, torch_threads: int):
+    """Load the serving model in a process-executor worker
+
+    Only stateless work runs here: the worker caches no frames, and the API process keeps the frames and crop
+    sources of the results it gets back.
+    """
+    global model
+    import torch
+    torch.set_num_threads(torch_threads)
+    from ultralytics import YOLO
+    model = YOLO(artifact, task="detect")
+    model.max_batch = max_batch
+    frame_cache.max_bytes = 0
+
+inference_executor = InferenceExecutor()
+
+@app.on_event("shutdown")
+async def stop_inference_executor():
+    inference_executor.shutdown()
+
+class ModelWorkerPool:
+    """Pool of model-worker processes that receive decoded frames through shared memory
+
+    Workers are spawned rather than forked and load the serving artifact themselves (see model_worker.py).
+    """
+    
+    def __init__(self, workers: int = MODEL_WORKERS, torch_threads: int = MODEL_WORKER_THREADS,
+                 timeout: float = MODEL_WORKER_TIMEOUT):
+        self.workers = max(1, workers)
+        self.torch_threads = torch_threads or max(1, available_cpus() // (SERVER_WORKERS * self.workers))
+        self.timeout = timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._task_queue = None
+        self._result_queue = None
+        self._processes: List[multiprocessing.Process] = []
+        # Workers started before the last model swap, finishing their current task before they exit
+        self._retiring: List[multiprocessing.Process] = []
+        self._generation = None
+        self._pending: Dict[int, Tuple[Future, List[SharedMemory]]] = {}
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._collector: Optional[threading.Thread] = None
+        self._running = False
+        self.tasks_completed = 0
+        self.tasks_failed = 0
+        self.frames_sent = 0
+        self.bytes_shared = 0
+        self.workers_restarted = 0
+        self.rolling_restarts = 0
+    
+    @property
+    def running(self) -> bool:
+        return self._running
+    
+    def _spawn_worker(self) -> multiprocessing.Process:
+        model_path = backend_info["artifact"] or MODEL_PATH
+        process = self._context.Process(target=model_worker_main,
+                                        args=(self._task_queue, self._result_queue, model_path, INFERENCE_IMGSZ,
+                                              backend_info.get("max_batch") or BATCH_SIZE, self.torch_threads,
+                                              self._generation.value, self._generation),
+                                        name="model-worker", daemon=True)
+        process.start()
+        return process
+    
+    def start(self):
+        self._task_queue = self._context.Queue()
+        self._result_queue = self._context.Queue()
+        self._generation = self._context.Value("i", 0)
+        self._processes = [self._spawn_worker() for _ in range(self.workers)]
+        self._running = True
+        self._collector = threading.Thread(target=self._collect_results, name="model-worker-results", daemon=True)
+        self._collector.start()
+        logger.info(f"Started {self.workers} model workers with {self.torch_threads} torch threads each")
+    
+    def stop(self):
+        self._running = False
+        for _ in self._processes:
+            self._task_queue.put(None)
+        for process in self._processes + self._retiring:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future, blocks in pending:
+            self._release(blocks)
+            if not future.done():
+                future.set_exception(RuntimeError("Model worker pool stopped"))
+    
+    def restart(self):
+        """Start replacement workers (which load the newly swapped-in model) and retire the current ones"""
+        with self._lock:
+            self._generation.value += 1
+            self._retiring.extend(self._processes)
+            self._processes = [self._spawn_worker() for _ in range(self.workers)]
+            self.rolling_restarts += 1
+        logger.info(f"Restarted {self.workers} model workers on the new model")
+    
+    @staticmethod
+    def _release(blocks: List[SharedMemory]):
+        for block in blocks:
+            block.close()
+            block.unlink()
+    
+    def submit(self, images: List[np.ndarray]) -> Future:
+        """Copy frames into shared memory and queue them; the future resolves to per-image box arrays"""
+        blocks = []
+        frames = []
+        for image in images:
+            image = np.ascontiguousarray(image, dtype=np.uint8)
+            block = SharedMemory(create=True, size=max(1, image.nbytes))
+            view = np.ndarray(image.shape, dtype=np.uint8, buffer=block.buf)
+            view[:] = image
+            del view
+            blocks.append(block)
+            frames.append((block.name, image.shape))
+        
+        future: Future = Future()
+        task_id = next(self._task_ids)
+        with self._lock:
+            self._pending[task_id] = (future, blocks)
+            self.frames_sent += len(frames)
+            self.bytes_shared += sum(block.size for block in blocks)
+        self._task_queue.put((task_id, frames))
+        return future
+    
+    async def detect(self, images: List[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Run images through a worker and wait (up to the pool timeout) for their box arrays"""
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(self.submit(images)), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Timed out waiting for a model worker")
+    
+    def _collect_results(self):
+        while self._running:
+            try:
+                task_id, outputs, error = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                self._replace_dead_workers()
+                continue
+            except (EOFError, OSError):
+                break
+            
+            with self._lock:
+                future, blocks = self._pending.pop(task_id, (None, []))
+                if error is None:
+                    self.tasks_completed += 1
+                else:
+                    self.tasks_failed += 1
+            self._release(blocks)
+            if future is None or future.done():
+                continue
+            if error is None:
+                future.set_result(outputs)
+            else:
+                future.set_exception(RuntimeError(f"Model worker failed: {error}"))
+    
+    def _replace_dead_workers(self):
+        with self._lock:
+            self._retiring = [process for process in self._retiring if process.is_alive()]
+            for index, process in enumerate(self._processes):
+                if self._running and not process.is_alive():
+                    logger.error(f"Model worker {process.pid} exited with code {process.exitcode}, restarting")
+                    self._processes[index] = self._spawn_worker()
+                    self.workers_restarted += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "alive": sum(1 for process in self._processes if process.is_alive()),
+                "torch_threads_per_worker": self.torch_threads,
+                "pending_tasks": len(self._pending),
+                "tasks_completed": self.tasks_completed,
+                "tasks_failed": self.tasks_failed,
+                "frames_sent": self.frames_sent,
+                "bytes_shared": self.bytes_shared,
+                "workers_restarted": self.workers_restarted,
+                "rolling_restarts": self.rolling_restarts,
+                "retiring": sum(1 for process in self._retiring if process.is_alive()),
+            }
+
+model_worker_pool: Optional[ModelWorkerPool] = ModelWorkerPool() if MODEL_WORKERS > 0 else None
+
+_model_workers_lock = threading.Lock()
+
+def start_model_workers_if_ready():
+    """Start the model worker pool once (it needs the model loaded, since workers load the artifact it settled on)"""
+    if model_worker_pool is None:
+        return
+    with _model_workers_lock:
+        if model_worker_pool.running:
+            return
+        if model is None:
+            logger.error("Model not loaded, not starting model workers")
+        else:
+            model_worker_pool.start()
+
+@app.on_event("startup")
+async def start_model_workers():
+    # With a background load, the loader thread starts the workers when the model is ready
+    if model_load_done.is_set():
+        start_model_workers_if_ready()
+
+@app.on_event("shutdown")
+async def stop_model_workers():
+    if model_worker_pool is not None and model_worker_pool.running:
+        model_worker_pool.stop()
+
+class MicroBatchScheduler:
+    """Collects images submitted within a short window and runs them as one batched forward pass"""
+    
+    def __init__(self, window_ms: float = MICROBATCH_WINDOW_MS, max_batch_size: int = MICROBATCH_MAX_SIZE):
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batch_size_histogram: Dict[int, int] = {}
+        self.batches_run = 0
+        self.images_processed = 0
+        self.failed_batches = 0
+        self.cancelled = 0
+        self.restarts = 0
+        self.total_wait_seconds = 0.0
+        self.max_queue_depth = 0
+    
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._thread is not None:
+                self.restarts += 1
+                logger.error("Micro-batch scheduler thread died, restarting it")
+            self._thread = threading.Thread(target=self._run, name="microbatch-scheduler", daemon=True)
+            self._thread.start()
+        logger.info(f"Micro-batch scheduler started (window {self.window * 1000:.1f} ms, "
+                    f"max batch {self.max_batch_size})")
+    
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def submit(self, image: np.ndarray, frame_id: Optional[str] = None, scale: int = 1) -> Future:
+        """Queue an image for the next batch; the future resolves to its extract_detections result"""
+        if self._thread is not None and not self._thread.is_alive():
+            self.start()
+        future: Future = Future()
+        self._queue.put((image, frame_id, scale, future, time.perf_counter()))
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return future
+    
+    def _collect(self, first) -> List[Any]:
+        batch = [first]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the stop marker back so the run loop exits after this batch
+                self._queue.put(None)
+                break
+            if self._claim(item):
+                batch.append(item)
+        return batch
+    
+    def _claim(self, item) -> bool:
+        """Mark a queued future as running; False if its caller already cancelled it (e.g. timed out)"""
+        if item[3].set_running_or_notify_cancel():
+            return True
+        with self._lock:
+            self.cancelled += 1
+        return False
+    
+    @staticmethod
+    def _resolve(future: Future, result=None, error: Optional[BaseException] = None):
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass  # Already resolved; one bad future must not take the scheduler thread down
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if not self._claim(item):
+                continue
+            batch = self._collect(item)
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                logger.exception("Micro-batch scheduler failed to run a batch")
+                for _, _, _, future, _ in batch:
+                    self._resolve(future, error=e)
+    
+    def _run_batch(self, batch: List[Any]):
+        started = time.perf_counter()
+        with self._lock:
+            self.batches_run += 1
+            self.images_processed += len(batch)
+            self.batch_size_histogram[len(batch)] = self.batch_size_histogram.get(len(batch), 0) + 1
+            self.total_wait_seconds += sum(started - queued_at for _, _, _, _, queued_at in batch)
+        
+        try:
+            results = process_batch([image for image, _, _, _, _ in batch], batch_size=len(batch),
+                                    frame_ids=[frame_id for _, frame_id, _, _, _ in batch],
+                                    scales=[scale for _, _, scale, _, _ in batch])
+        except Exception as e:
+            with self._lock:
+                self.failed_batches += 1
+            for _, _, _, future, _ in batch:
+                self._resolve(future, error=e)
+            return
+        
+        for (_, _, _, future, _), result in zip(batch, results):
+            self._resolve(future, result)
     
-    # Convert all names in the DataFrame to lowercase for comparison
-    meanings_df['name_lower'] = meanings_df['name'].str.lower()
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": True,
+                "window_ms": self.window * 1000,
+                "max_batch_size": self.max_batch_size,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "batches_run": self.batches_run,
+                "images_processed": self.images_processed,
+                "failed_batches": self.failed_batches,
+                "cancelled": self.cancelled,
+                "restarts": self.restarts,
+                "average_batch_size": self.images_processed / self.batches_run if self.batches_run else 0.0,
+                "average_wait_ms": 1000 * self.total_wait_seconds / self.images_processed if self.images_processed else 0.0,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_size_histogram.items())},
+            }
+
+scheduler: Optional[MicroBatchScheduler] = MicroBatchScheduler() if MICROBATCH_ENABLED else None
+
+@app.on_event("startup")
+async def start_scheduler():
+    if scheduler is not None:
+        scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    if scheduler is not None:
+        scheduler.stop()
+
+def add_meanings(result: Dict[str, Any], language: Language) -> Dict[str, Any]:
+    """Attach meanings to detections and rename the count fields for the response"""
+    for detection in result["detections"]:
+        ornament_name = detection["class"]
+        logger.info(f"Looking up meaning for ornament: {ornament_name}")
+        
+        meaning = get_ornament_meaning(ornament_name, language)
+        if meaning:
+            detection["meaning"] = meaning
+            logger.info(f"Found meaning for {ornament_name}: {meaning[:30]}...")
+        else:
+            detection["meaning"] = f"No meaning available for '{ornament_name}'"
+            logger.warning(f"No meaning found for '{ornament_name}' in {language}")
     
-    # Search using the lowercase name
-    ornament_row = meanings_df[meanings_df["name_lower"] == ornament_name]
+    # Include total detection count for reference
+    result["total_detections"] = result.pop("all_detections_count", 0)
+    result["unique_detections"] = len(result["detections"])
+    return result
+
+def get_ornament_meaning(ornament_name: str, lang: Language = Language.ENGLISH) -> Optional[str]:
+    """Get the meaning of an ornament in the specified language"""
+    if time.monotonic() - _meanings_checked_at >= MEANINGS_RELOAD_INTERVAL:
+        reload_meanings_if_changed()
     
-    if not ornament_row.empty:
-        return ornament_row.iloc[0][lang]
+    # Lookups are case-insensitive; the index stores lowercase names
+    meaning = meanings_index.lookup(ornament_name, getattr(lang, "value", lang))
+    if meaning is not None:
+        return meaning
     
     # If no match found, log the issue
-    logger.warning(f"No meaning found for ornament '{ornament_name}'")
-    logger.info(f"Available ornaments: {', '.join(meanings_df['name'].tolist())}")
+    logger.warning(f"No meaning found for ornament '{ornament_name.lower()}' "
+                   f"({len(meanings_index)} ornaments available)")
     
     return None
 
@@ -215,13 +2483,158 @@ async def status():
     return {
         "status": "running",
         "model_loaded": model is not None,
+        "model_load": model_state,
         "model_path": MODEL_PATH,
         "model_path_exists": os.path.exists(MODEL_PATH),
-        "meanings_loaded": len(meanings_df) > 0,
+        "backend": backend_info,
+        "model_registry": model_registry.stats(),
+        "meanings_loaded": len(meanings_index) > 0,
+        "inference_executor": inference_executor.stats(),
+        "result_cache": detection_cache.stats() if detection_cache is not None else None,
+        "frame_cache": frame_cache.stats(),
+        "crop_store": crop_store.stats(),
+        "streams": {"active": active_streams, "max": WS_MAX_STREAMS},
+        "model_workers": model_worker_pool.stats() if model_worker_pool is not None else None,
         "working_directory": os.getcwd(),
         "python_path": sys.path,
     }
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and serving requests (the model may still be loading)"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: 200 once the model is loaded, 503 while it is loading or if loading failed"""
+    if model is None:
+        return JSONResponse(status_code=503, content={"status": "not_ready", "model_load": model_state})
+    return {"status": "ready", "model_load": model_state}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request counts, per-stage latency histograms and queue gauges in Prometheus text format"""
+    executor_stats = inference_executor.stats()
+    queue_help = "Work waiting to be processed, by queue."
+    gauges = [
+        ("ornament_model_loaded", "Whether the detection model is loaded (1) or not (0).", {}, int(model is not None)),
+        ("ornament_queue_depth", queue_help, {"queue": "inference_executor"}, executor_stats["queued"]),
+        ("ornament_queue_depth", queue_help, {"queue": "scheduler"},
+         scheduler.stats()["queue_depth"] if scheduler is not None else 0),
+        ("ornament_queue_depth", queue_help, {"queue": "model_workers"},
+         model_worker_pool.stats()["pending_tasks"] if model_worker_pool is not None else 0),
+        ("ornament_inference_in_flight", "Calls running or queued on the inference executor.", {},
+         executor_stats["in_flight"]),
+        ("ornament_streams_active", "Open WebSocket detection streams.", {}, active_streams),
+    ]
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/profiling")
+async def profiling_status(x_admin_token: Optional[str] = Header(None)):
+    """Get the request profiler's sample rate and the last profile written"""
+    require_admin(x_admin_token)
+    return request_profiler.stats()
+
+@app.post("/admin/profiling")
+async def configure_profiling(sample_rate: int = Form(...), interval_ms: Optional[float] = Form(None),
+                              x_admin_token: Optional[str] = Header(None)):
+    """Profile 1 in sample_rate /detect/ requests from now on (0 switches profiling off)"""
+    require_admin(x_admin_token)
+    require_single_server_worker("change profiling")
+    request_profiler.configure(sample_rate, interval_ms)
+    logger.info(f"Request profiling set to 1 in {request_profiler.sample_rate}")
+    return request_profiler.stats()
+
+def loadable_model_path(path: str) -> str:
+    """Absolute path of weights the admin API may load: a .pt file in the model catalog or under MODEL_CACHE_DIR"""
+    if MODEL_CACHE_DIR:
+        cache_dir = os.path.realpath(MODEL_CACHE_DIR)
+        resolved = os.path.realpath(path)
+        if os.path.commonpath([resolved, cache_dir]) == cache_dir:
+            return resolved
+    # Picks up weights copied under MODEL_CATALOG_ROOTS since the last refresh
+    if artifact_catalog.refresh(MODEL_CATALOG_ROOTS)["scanned"]:
+        artifact_catalog.save()
+    entry = artifact_catalog.get(path)
+    if entry is None or entry["kind"] != "pt":
+        raise HTTPException(status_code=403, detail="Model versions can only be loaded from .pt files in the "
+                                                    "model catalog or MODEL_CACHE_DIR")
+    return entry["path"]
+
+@app.get("/admin/models")
+async def model_versions(x_admin_token: Optional[str] = Header(None)):
+    """List the loaded model versions, the active one, the traffic split and per-version latency"""
+    require_admin(x_admin_token)
+    return model_registry.stats()
+
+@app.post("/admin/models", status_code=202)
+async def load_model_version_endpoint(path: str = Form(...), version: Optional[str] = Form(None),
+                                      activate: bool = Form(False), x_admin_token: Optional[str] = Header(None)):
+    """Load and warm up .pt weights in the background as a new version, switching traffic to it if activate is set"""
+    require_admin(x_admin_token)
+    require_single_server_worker("load model versions")
+    if not path.endswith(".pt"):
+        raise HTTPException(status_code=400, detail="Model versions are loaded from .pt weights")
+    path = await run_in_threadpool(loadable_model_path, path)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Model file not found at {path}")
+    
+    name = version or model_version_name(path, await run_in_threadpool(file_sha256, path))
+    entry = model_registry.add(name, path)
+    threading.Thread(target=load_model_version, args=(name, path, activate),
+                     name=f"model-loader-{name}", daemon=True).start()
+    logger.info(f"Loading model version {name} from {path}")
+    return {key: value for key, value in entry.items() if key != "model"}
+
+@app.get("/admin/models/catalog")
+async def model_catalog_listing(kind: Optional[str] = None, has_class: Optional[str] = None, sort: str = "mtime",
+                                refresh: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """Query the catalog of model artifacts on disk (refresh=true re-reads files that changed first)"""
+    require_admin(x_admin_token)
+    if sort not in ("mtime", "size", "path", "latency"):
+        raise HTTPException(status_code=400, detail="sort must be mtime, size, path or latency")
+    counts = None
+    if refresh:
+        counts = await run_in_threadpool(artifact_catalog.refresh, MODEL_CATALOG_ROOTS)
+        await run_in_threadpool(artifact_catalog.save)
+    return {"refreshed": counts, "entries": artifact_catalog.query(kind, has_class, sort)}
+
+@app.post("/admin/models/split")
+async def split_model_traffic(weights: str = Form(""), x_admin_token: Optional[str] = Header(None)):
+    """Split /detect/ traffic between loaded versions, e.g. "best-1a2b3c4d:90,best-5e6f7a8b:10" ("" stops splitting)"""
+    require_admin(x_admin_token)
+    require_single_server_worker("split traffic")
+    split = {}
+    for part in filter(None, (part.strip() for part in weights.split(","))):
+        name, _, weight = part.rpartition(":")
+        try:
+            split[name] = float(weight)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Expected version:weight, got {part}")
+    if split and (inference_executor.kind != "thread" or model_worker_pool is not None):
+        raise HTTPException(status_code=409, detail="Traffic splitting needs the thread inference executor "
+                                                    "and no model workers")
+    model_registry.set_split(split)
+    logger.info(f"Model traffic split set to {split or 'off'}")
+    return model_registry.stats()
+
+@app.post("/admin/models/{version}/activate")
+async def activate_model_version_endpoint(version: str, x_admin_token: Optional[str] = Header(None)):
+    """Switch traffic to a loaded version (also how to roll back to the previous one)"""
+    require_admin(x_admin_token)
+    require_single_server_worker("switch model versions")
+    await run_in_threadpool(activate_model_version, version)
+    return model_registry.stats()
+
+@app.delete("/admin/models/{version}")
+async def unload_model_version(version: str, x_admin_token: Optional[str] = Header(None)):
+    """Unload a version that isn't serving traffic"""
+    require_admin(x_admin_token)
+    require_single_server_worker("unload model versions")
+    model_registry.remove(version)
+    logger.info(f"Unloaded model version {version}")
+    return model_registry.stats()
+
 @app.get("/", response_class=HTMLResponse)
 async def home():
     """API home page with a simple upload form"""
@@ -495,9 +2908,139 @@ async def home():
     """
     return html_content
 
+def decode_scale_for(source, tiled: Optional[bool] = False) -> int:
+    """Largest DCT reduction (1, 2, 4 or 8) that keeps a JPEG's long side at least INFERENCE_IMGSZ
+
+    source is a path or file object; only the image header is read. Images that will be tiled,
+    and everything when crop sources aren't stored (crops need the full-size image), decode at 1.
+    """
+    if not REDUCED_DECODE or not CROP_STORE_SOURCES:
+        return 1
+    try:
+        with PILImage.open(source) as probe:
+            if probe.format != "JPEG":
+                return 1
+            width, height = probe.size
+    except Exception:
+        return 1
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+    
+    if should_tile_size(width, height, tiled):
+        return 1
+    for factor in sorted(REDUCED_DECODE_FLAGS, reverse=True):
+        if max(width, height) // factor >= INFERENCE_IMGSZ:
+            return factor
+    return 1
+
+def decode_image_bytes(data: bytes, scale: int = 1) -> Optional[np.ndarray]:
+    """Decode encoded image bytes into a BGR array (at 1/scale size), or None if they are not an image"""
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), REDUCED_DECODE_FLAGS.get(scale, cv2.IMREAD_COLOR))
+
+def decode_upload(file: UploadFile, tiled: Optional[bool] = None,
+                  timings: Optional[Dict[str, float]] = None) -> Tuple[Optional[np.ndarray], int, int]:
+    """Decode an upload once into a BGR array, returning it with the upload size in bytes and its decode scale"""
+    upload = file.file
+    upload.seek(0, os.SEEK_END)
+    size = upload.tell()
+    upload.seek(0)
+    
+    if size == 0:
+        return None, 0, 1
+    with timed_stage(timings, "decode"):
+        scale = decode_scale_for(upload, tiled)
+    if size <= UPLOAD_MEMORY_LIMIT:
+        with timed_stage(timings, "upload_read"):
+            data = upload.read()
+        with timed_stage(timings, "decode"):
+            return decode_image_bytes(data, scale), size, scale
+    
+    # Large uploads are spilled to disk and decoded from a memory map instead of a bytes copy
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as tmp:
+        with timed_stage(timings, "upload_read"):
+            shutil.copyfileobj(upload, tmp)
+            tmp.flush()
+        with timed_stage(timings, "decode"):
+            encoded = np.memmap(tmp.name, dtype=np.uint8, mode="r")
+            image = cv2.imdecode(encoded, REDUCED_DECODE_FLAGS.get(scale, cv2.IMREAD_COLOR))
+            del encoded
+    return image, size, scale
+
+async def detect_decoded_image(image: np.ndarray, frame_id: Optional[str] = None,
+                               tiled: Optional[bool] = None, scale: int = 1, detector=None) -> Dict[str, Any]:
+    """Process a decoded image on a model worker, the micro-batch scheduler or the inference executor
+
+    detector is a model version other than the serving one (traffic split); it always runs on the thread executor.
+    """
+    await wait_for_model()
+    frame_id = frame_id or uuid.uuid4().hex
+    use_tiles = should_tile(image, tiled)
+    if detector is not None and detector is not model:
+        return await inference_executor.run(process_decoded_image, image, frame_id, use_tiles, scale, detector)
+    if model_worker_pool is not None and model_worker_pool.running:
+        names = model.names
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        if use_tiles:
+            # Spread the tiles over all model workers, then merge them here
+            tiles = image_tiles(image)
+            chunks = [tiles[start:start + BATCH_SIZE] for start in range(0, len(tiles), BATCH_SIZE)]
+            outputs = await asyncio.gather(*(model_worker_pool.detect([tile for _, _, tile in chunk])
+                                             for chunk in chunks))
+            tile_arrays = [arrays for chunk_outputs in outputs for arrays in chunk_outputs]
+            box_arrays = [merge_tile_arrays(tile_arrays, [(x, y) for x, y, _ in tiles])]
+        else:
+            box_arrays = await model_worker_pool.detect([image])
+        timings["inference"] = time.perf_counter() - started
+        
+        def postprocess():
+            with timed_stage(timings, "postprocess"):
+                return detections_from_arrays(box_arrays, image, frame_id, scale, names)
+        result = await run_in_threadpool(postprocess)
+        result["timings"] = timings
+        return result
+    if use_tiles:
+        return keep_frame(await inference_executor.run(process_decoded_image, image, frame_id, True, scale),
+                          frame_id, image, scale)
+    if scheduler is not None:
+        # Shares a forward pass with concurrent requests; counts against the same in-flight limit as the executor
+        async with inference_executor.slot():
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(scheduler.submit(image, frame_id, scale)),
+                                              timeout=MICROBATCH_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=504, detail="Timed out waiting for the micro-batch scheduler")
+    return keep_frame(await inference_executor.run(process_decoded_image, image, frame_id, False, scale),
+                      frame_id, image, scale)
+
+def keep_frame(result: Dict[str, Any], frame_id: str, image: np.ndarray, scale: int) -> Dict[str, Any]:
+    """Cache a frame that an executor process detected on, since crops are served from this process"""
+    if inference_executor.kind == "process" and result["detections"] and scale == 1:
+        frame_cache.put(frame_id, image)
+    return result
+
+def timed_response(result: Dict[str, Any], timings: Dict[str, float], started: float,
+                   include_timings: bool) -> JSONResponse:
+    """Serialize a detection result, reporting its stage timings in a Server-Timing header (and the body if asked)"""
+    if include_timings:
+        # Serialization can't time itself into the body it produces; it only appears in the header
+        result["timings"] = {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+        result["timings"]["total"] = round((time.perf_counter() - started) * 1000, 3)
+    with timed_stage(timings, "serialization"):
+        response = JSONResponse(content=result)
+    metrics.observe_timings(timings)
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = server_timing_header(timings, time.perf_counter() - started)
+    return response
+
 @app.post("/detect/")
 async def detect_ornaments(file: UploadFile = File(...), 
-                          language: Language = Form(Language.ENGLISH)):
+                          language: Language = Form(Language.ENGLISH),
+                          tiled: Optional[bool] = Form(None),
+                          timings: bool = Form(False)):
     """
     Detect ornaments in an uploaded image and return their meanings
     """
@@ -505,64 +3048,552 @@ async def detect_ornaments(file: UploadFile = File(...),
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    # Create a temporary file with proper extension
-    temp_file = None
-    
+    started = time.perf_counter()
+    stage_timings: Dict[str, float] = {}
+    sampler = request_profiler.maybe_start()
     try:
-        # Create a proper temporary file that works cross-platform
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-            temp_file = tmp.name
-            # Save uploaded file to the temporary file
-            shutil.copyfileobj(file.file, tmp)
+        # With a traffic split this may be another version than the active one; its results aren't cached
+        version, detector = model_registry.pick()
+        use_cache = detection_cache is not None and version == model_registry.active
         
-        logger.info(f"Saved uploaded image to temporary file: {temp_file}")
+        # Identical bytes under the same model were already processed; skip decode and inference
+        cache_key = None
+        if use_cache:
+            with timed_stage(stage_timings, "upload_read"):
+                cache_key = await run_in_threadpool(detection_cache.key_for_file, file.file, cache_variant(tiled))
+            cached = detection_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Serving detections from cache")
+                with timed_stage(stage_timings, "meaning_lookup"):
+                    result = add_meanings(cached, language)
+                result["cached"] = True
+                result["model_version"] = version
+                return timed_response(result, stage_timings, started, timings)
         
-        # Check if the file exists and has content
-        file_stat = os.stat(temp_file)
-        logger.info(f"Temporary file size: {file_stat.st_size} bytes")
+        # Decode the upload once, at reduced size when the model would downscale it anyway
+        image, upload_size, scale = await run_in_threadpool(decode_upload, file, tiled, stage_timings)
+        logger.info(f"Read uploaded image: {upload_size} bytes (decoded at 1/{scale} scale)")
         
-        if file_stat.st_size == 0:
+        if upload_size == 0:
             raise HTTPException(status_code=400, detail="Uploaded file is empty")
+        if image is None:
+            raise HTTPException(status_code=400, detail="Could not read image")
         
-        # Process the image
-        result = process_image(temp_file)
+        frame_id = uuid.uuid4().hex
+        result = await detect_decoded_image(image, frame_id, tiled, scale, detector)
+        merge_timings(stage_timings, result.pop("timings", None))
+        # Before the first load finishes there is nothing to pick; the request waited for the active version
+        version = version or model_registry.active
+        model_registry.observe(version, stage_timings.get("inference", 0.0), len(result["detections"]))
         
-        # Add meanings to the result
-        for detection in result["detections"]:
-            ornament_name = detection["class"]
-            logger.info(f"Looking up meaning for ornament: {ornament_name}")
-            
-            meaning = get_ornament_meaning(ornament_name, language)
-            if meaning:
-                detection["meaning"] = meaning
-                logger.info(f"Found meaning for {ornament_name}: {meaning[:30]}...")
-            else:
-                detection["meaning"] = f"No meaning available for '{ornament_name}'"
-                logger.warning(f"No meaning found for '{ornament_name}' in {language}")
+        await run_in_threadpool(keep_crop_source, frame_id, file.file, result["detections"], scale)
         
-        # Get all unique ornament classes detected
-        ornament_classes = [d["class"] for d in result["detections"]]
-            
-        # Include total detection count for reference
-        result["total_detections"] = result.pop("all_detections_count", 0)
-        result["unique_detections"] = len(result["detections"])
+        if cache_key is not None:
+            detection_cache.put(cache_key, cacheable_result(result))
+        
+        # Add meanings to the result
+        with timed_stage(stage_timings, "meaning_lookup"):
+            result = add_meanings(result, language)
+        result["cached"] = False
+        result["model_version"] = version
         
         logger.info(f"Successfully processed image with {result['unique_detections']} unique ornament types")
-        return JSONResponse(content=result)
+        return timed_response(result, stage_timings, started, timings)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+    finally:
+        if sampler is not None:
+            await run_in_threadpool(request_profiler.finish, sampler, "detect", stage_timings)
+
+def read_batch_uploads(files: List[UploadFile]) -> List[Dict[str, Any]]:
+    """Expand uploaded files (images or zip archives) into named raw images
+
+    Archives are checked against MAX_BATCH_FILES and MAX_BATCH_BYTES from their directory before any member is
+    decompressed, so a small zip can't expand into more images or bytes than a batch may hold.
+    """
+    entries = []
+    total_bytes = 0
     
+    def check_limits(count: int, size: int):
+        if count > MAX_BATCH_FILES:
+            raise HTTPException(status_code=400, detail=f"Too many images in batch (max {MAX_BATCH_FILES})")
+        if size > MAX_BATCH_BYTES:
+            raise HTTPException(status_code=413, detail=f"Batch images exceed {MAX_BATCH_BYTES} bytes uncompressed")
+    
+    for upload in files:
+        data = upload.file.read()
+        filename = upload.filename or "upload"
+        is_zip = (upload.content_type in ("application/zip", "application/x-zip-compressed")
+                  or filename.lower().endswith(".zip"))
+        
+        if is_zip:
+            try:
+                with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                    members = [info for info in archive.infolist()
+                               if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)]
+                    check_limits(len(entries) + len(members), total_bytes + sum(info.file_size for info in members))
+                    for info in members:
+                        # Reads stop at the member's declared size, which the check above already counted
+                        entries.append({"filename": info.filename, "data": archive.read(info)})
+                        total_bytes += len(entries[-1]["data"])
+                        check_limits(len(entries), total_bytes)
+            except zipfile.BadZipFile:
+                entries.append({"filename": filename, "error": "Invalid zip archive"})
+        elif upload.content_type and upload.content_type.startswith("image/"):
+            entries.append({"filename": filename, "data": data})
+            total_bytes += len(data)
+        else:
+            entries.append({"filename": filename, "error": "File must be an image or zip archive"})
+        
+        check_limits(len(entries), total_bytes)
+    return entries
+
+def decode_batch_entries(entries: List[Dict[str, Any]]) -> Tuple[List[np.ndarray], List[Dict[str, Any]]]:
+    """Decode raw batch entries, marking undecodable ones with an error"""
+    # Decode everything up front so broken files don't break a whole batch
+    images = []
+    decoded_entries = []
+    for entry in entries:
+        if "error" in entry:
+            continue
+        data = entry.pop("data")
+        entry["timings"] = {}
+        with timed_stage(entry["timings"], "decode"):
+            entry["scale"] = decode_scale_for(io.BytesIO(data))
+            image = decode_image_bytes(data, entry["scale"])
+        if image is None:
+            entry["error"] = "Could not read image"
+            continue
+        images.append(image)
+        decoded_entries.append(entry)
+    return images, decoded_entries
+
+def fill_cached_entries(entries: List[Dict[str, Any]]) -> Tuple[List[int], List[Optional[str]]]:
+    """Fill batch entries from the result cache; return indices and cache keys of the misses"""
+    miss_indices = []
+    miss_keys = []
+    for index, entry in enumerate(entries):
+        if "data" not in entry:
+            continue
+        key = None
+        if detection_cache is not None:
+            key = detection_cache.key_for(entry["data"], cache_variant(False))
+            cached = detection_cache.get(key)
+            if cached is not None:
+                entry.pop("data")
+                entry.update(cached)
+                entry["cached"] = True
+                continue
+        miss_indices.append(index)
+        miss_keys.append(key)
+    return miss_indices, miss_keys
+
+def run_batch_detection(entries: List[Dict[str, Any]], batch_size: int,
+                        return_frames: bool = False) -> List[Dict[str, Any]]:
+    """Decode raw batch entries and fill each one with its detections or an error
+
+    With return_frames, full-size frames with detections come back under "frame" (for runs in another process).
+    """
+    images, decoded_entries = decode_batch_entries(entries)
+    frame_ids = [entry["frame_id"] for entry in decoded_entries]
+    scales = [entry["scale"] for entry in decoded_entries]
+    for entry, image, result in zip(decoded_entries, images, process_batch(images, batch_size, frame_ids, scales)):
+        result_timings = result.pop("timings")
+        entry.update(result)
+        merge_timings(entry["timings"], result_timings)
+        if return_frames and result["detections"] and entry["scale"] == 1:
+            entry["frame"] = image
+    return entries
+
+@app.post("/detect/batch")
+async def detect_ornaments_batch(files: List[UploadFile] = File(...),
+                                 language: Language = Form(Language.ENGLISH),
+                                 batch_size: Optional[int] = Form(None)):
+    """
+    Detect ornaments in many images (multipart files and/or zip archives) using batched inference
+    """
+    batch_size = batch_size or BATCH_SIZE
+    if batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be at least 1")
+    await wait_for_model()
+    
+    timings: Dict[str, float] = {}
+    with timed_stage(timings, "upload_read"):
+        all_entries = await run_in_threadpool(read_batch_uploads, files)
+    logger.info(f"Received batch of {len(all_entries)} images (batch size {batch_size})")
+    
+    # Only images that aren't already cached go through the model
+    miss_indices, miss_keys = await run_in_threadpool(fill_cached_entries, all_entries)
+    entries = [all_entries[index] for index in miss_indices]
+    
+    # Keep the encoded bytes of each image so crops can be rendered from them later
+    sources = {}
+    for entry in entries:
+        entry["frame_id"] = uuid.uuid4().hex
+        sources[entry["frame_id"]] = entry["data"]
+    
+    if entries and model_worker_pool is not None and model_worker_pool.running:
+        # Spread batches across the model workers and build crops here from the returned boxes
+        images, decoded_entries = await run_in_threadpool(decode_batch_entries, entries)
+        chunks = [images[start:start + batch_size] for start in range(0, len(images), batch_size)]
+        started = time.perf_counter()
+        chunk_outputs = await asyncio.gather(*(model_worker_pool.detect(chunk) for chunk in chunks))
+        inference_share = (time.perf_counter() - started) / max(1, len(images))
+        box_arrays = [arrays for outputs in chunk_outputs for arrays in outputs]
+        for entry, image, arrays in zip(decoded_entries, images, box_arrays):
+            entry["timings"]["inference"] = inference_share
+            with timed_stage(entry["timings"], "postprocess"):
+                entry.update(await run_in_threadpool(detections_from_arrays, [arrays], image, entry["frame_id"],
+                                                     entry["scale"]))
+    elif entries:
+        entries = await inference_executor.run(run_batch_detection, entries, batch_size,
+                                               inference_executor.kind == "process")
+    
+    for index, key, entry in zip(miss_indices, miss_keys, entries):
+        all_entries[index] = entry
+        frame_id = entry.pop("frame_id")
+        scale = entry.pop("scale", 1)
+        frame = entry.pop("frame", None)
+        if frame is not None:
+            frame_cache.put(frame_id, frame)
+        merge_timings(timings, entry.pop("timings", None))
+        if entry.get("detections"):
+            await run_in_threadpool(keep_crop_source, frame_id, sources[frame_id], entry["detections"], scale)
+        if "detections" in entry:
+            entry["cached"] = False
+            if key is not None:
+                detection_cache.put(key, cacheable_result(entry))
+    
+    entries = all_entries
+    with timed_stage(timings, "meaning_lookup"):
+        for entry in entries:
+            if "detections" in entry:
+                add_meanings(entry, language)
+    
+    failed = sum(1 for entry in entries if "error" in entry)
+    logger.info(f"Successfully processed batch: {len(entries) - failed} images, {failed} failed")
+    with timed_stage(timings, "serialization"):
+        response = JSONResponse(content={
+            "results": entries,
+            "total_images": len(entries),
+            "processed_images": len(entries) - failed,
+            "failed_images": failed,
+            "batch_size": batch_size,
+        })
+    metrics.observe_timings(timings)
+    return response
+
+@app.get("/crop-store/stats")
+async def crop_store_stats():
+    """Get crop store disk usage and eviction counters"""
+    return crop_store.stats()
+
+@app.get("/crops/{crop_id}")
+async def get_crop(crop_id: str):
+    """Return a detection crop, encoding it from the frame cache or stored source on first fetch"""
+    if CROP_ID_PATTERN.match(crop_id) is None:
+        raise HTTPException(status_code=404, detail="Crop not found")
+    
+    crop_path = await asyncio.get_running_loop().run_in_executor(crop_executor, render_crop, crop_id)
+    if crop_path is None:
+        raise HTTPException(status_code=404, detail="Crop not found or its source image has expired")
+    return FileResponse(crop_path, media_type=CROP_MEDIA_TYPES.get(CROP_FORMAT, "image/jpeg"),
+                        headers={"Cache-Control": "public, max-age=86400, immutable"})
+
+def save_upload_to_temp_file(file: UploadFile, suffix: str) -> str:
+    """Copy an upload to a temporary file (OpenCV can only open videos by path) and return its path"""
+    file.file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        shutil.copyfileobj(file.file, tmp)
+        return tmp.name
+
+def process_video(video_path: str, sample_fps: float = VIDEO_SAMPLE_FPS,
+                  diff_threshold: float = VIDEO_DIFF_THRESHOLD, batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """Sample frames from a video, skip near-duplicates, batch the rest and build a per-class timeline
+
+    The best frame of each class is returned under "best_frames" for the caller to keep (see keep_video_frames),
+    since this may run in an executor process.
+    """
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise HTTPException(status_code=400, detail="Could not read video")
+    
+    source_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)  # container metadata; 0 when unknown
+    step = max(1, round(source_fps / sample_fps)) if sample_fps > 0 else 1
+    truncated = False
+    
+    timeline: Dict[str, Dict[str, Any]] = {}
+    best_frames: Dict[str, np.ndarray] = {}  # frame_id -> frame, only for frames that are some class's best
+    pending: List[Tuple[np.ndarray, float, str]] = []
+    last_thumbnail = None
+    frames_read = frames_sampled = frames_unchanged = frames_processed = 0
+    timings: Dict[str, float] = {}
+    
+    def flush():
+        nonlocal frames_processed
+        if not pending:
+            return
+        # Only the best frames are kept (by keep_video_frames); caching every sampled frame would push image
+        # requests' frames out of the frame cache
+        results = process_batch([frame for frame, _, _ in pending], batch_size=len(pending),
+                                frame_ids=[frame_id for _, _, frame_id in pending], cache_frames=False)
+        frames_processed += len(pending)
+        for (frame, timestamp, frame_id), result in zip(pending, results):
+            merge_timings(timings, result.pop("timings", None))
+            for detection in result["detections"]:
+                entry = timeline.setdefault(detection["class"], {
+                    "class": detection["class"],
+                    "first_seen": timestamp,
+                    "frames_detected": 0,
+                    "timestamps": [],
+                    "best_confidence": -1.0,
+                })
+                entry["last_seen"] = timestamp
+                entry["frames_detected"] += 1
+                entry["timestamps"].append(round(timestamp, 3))
+                if detection["confidence"] > entry["best_confidence"]:
+                    entry.update({
+                        "best_confidence": detection["confidence"],
+                        "best_timestamp": timestamp,
+                        "bbox": detection["bbox"],
+                        "cropped_image": detection["cropped_image"],
+                        "_frame_id": frame_id,
+                    })
+                    best_frames[frame_id] = frame
+        pending.clear()
+        # Forget frames that are no longer anyone's best
+        in_use = {entry["_frame_id"] for entry in timeline.values()}
+        for frame_id in list(best_frames):
+            if frame_id not in in_use:
+                del best_frames[frame_id]
+    
+    try:
+        while True:
+            if frames_processed + len(pending) >= VIDEO_MAX_PROCESSED_FRAMES:
+                # Stopped early only if the video has frames left
+                truncated = capture.grab()
+                break
+            # grab() advances without converting the frame; only sampled frames are retrieved
+            if not capture.grab():
+                break
+            frames_read += 1
+            if (frames_read - 1) % step:
+                continue
+            with timed_stage(timings, "decode"):
+                ok, frame = capture.retrieve()
+            if not ok:
+                break
+            frames_sampled += 1
+            
+            thumbnail = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (VIDEO_DIFF_SIZE, VIDEO_DIFF_SIZE),
+                                   interpolation=cv2.INTER_AREA)
+            if last_thumbnail is not None and float(cv2.absdiff(thumbnail, last_thumbnail).mean()) < diff_threshold:
+                frames_unchanged += 1
+                continue
+            last_thumbnail = thumbnail
+            
+            pending.append((frame, (frames_read - 1) / source_fps, uuid.uuid4().hex))
+            if len(pending) >= batch_size:
+                flush()
+        flush()
     finally:
-        # Clean up temporary file
-        if temp_file and os.path.exists(temp_file):
+        capture.release()
+    
+    classes = sorted(timeline.values(), key=lambda entry: entry["first_seen"])
+    for entry in classes:
+        del entry["_frame_id"]
+    
+    logger.info(f"Video: read {frames_read} frames, sampled {frames_sampled}, skipped {frames_unchanged} "
+                f"unchanged, processed {frames_processed}, found {len(classes)} ornament types")
+    return {
+        "timeline": classes,
+        "source_fps": source_fps,
+        "duration": max(frame_count, frames_read) / source_fps,
+        "duration_analyzed": frames_read / source_fps,
+        "truncated": truncated,
+        "frames_read": frames_read,
+        "frames_sampled": frames_sampled,
+        "frames_skipped_unchanged": frames_unchanged,
+        "frames_processed": frames_processed,
+        "timings": timings,
+        "best_frames": best_frames,
+    }
+
+def keep_video_frames(best_frames: Dict[str, np.ndarray], timeline: List[Dict[str, Any]]):
+    """Keep each class's best video frame in the frame cache; it is encoded to disk only if evicted before its crops
+    are rendered, or right away with several server workers"""
+    for frame_id, frame in best_frames.items():
+        frame_cache.put(frame_id, frame)
+        crop_ids = [crop_id for crop_id in crop_ids_of(timeline) if crop_id.startswith(f"{frame_id}_")]
+        if CROP_STORE_SOURCES and not (CROP_SOURCES_IN_MEMORY and frame_cache.attach_source(frame_id, None, crop_ids)):
+            write_crop_source(frame_id, frame, None)
+
+@app.post("/detect/video")
+async def detect_ornaments_video(file: UploadFile = File(...),
+                                 language: Language = Form(Language.ENGLISH),
+                                 sample_fps: Optional[float] = Form(None),
+                                 diff_threshold: Optional[float] = Form(None)):
+    """
+    Detect ornaments in a video and return a per-class timeline with the best frame's crop
+    """
+    if file.content_type and not (file.content_type.startswith("video/")
+                                  or file.content_type == "application/octet-stream"):
+        raise HTTPException(status_code=400, detail="File must be a video")
+    
+    await wait_for_model()
+    suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
+    timings: Dict[str, float] = {}
+    with timed_stage(timings, "upload_read"):
+        temp_file = await run_in_threadpool(save_upload_to_temp_file, file, suffix)
+    try:
+        result = await inference_executor.run(
+            process_video, temp_file,
+            VIDEO_SAMPLE_FPS if sample_fps is None else sample_fps,
+            VIDEO_DIFF_THRESHOLD if diff_threshold is None else diff_threshold,
+            BATCH_SIZE,
+        )
+    finally:
+        try:
+            os.unlink(temp_file)
+        except OSError as e:
+            logger.warning(f"Failed to remove temporary file {temp_file}: {str(e)}")
+    
+    await run_in_threadpool(keep_video_frames, result.pop("best_frames"), result["timeline"])
+    merge_timings(timings, result.pop("timings", None))
+    with timed_stage(timings, "meaning_lookup"):
+        for entry in result["timeline"]:
+            meaning = get_ornament_meaning(entry["class"], language)
+            entry["meaning"] = meaning or f"No meaning available for '{entry['class']}'"
+    with timed_stage(timings, "serialization"):
+        response = JSONResponse(content=result)
+    metrics.observe_timings(timings)
+    return response
+
+# Open WebSocket streams; only touched from the event loop
+active_streams = 0
+
+@app.websocket("/ws/detect")
+async def detect_stream(websocket: WebSocket, language: Language = Language.ENGLISH):
+    """
+    Live detection: clients send binary JPEG frames and get detections back as JSON messages.
+    Only the newest unprocessed frame is kept, so a slow model drops frames instead of falling behind.
+    A text message with a language code (en, kg, ru) switches the meanings language.
+    """
+    global active_streams
+    await websocket.accept()
+    if active_streams >= WS_MAX_STREAMS:
+        logger.warning(f"Rejecting stream, {active_streams} already open")
+        await websocket.close(code=1013, reason="Too many concurrent streams, try again later")
+        return
+    
+    active_streams += 1
+    logger.info(f"Stream opened ({active_streams} active)")
+    state = {"language": language, "frame": None, "sequence": 0, "received_at": 0.0, "received": 0, "dropped": 0}
+    frame_ready = asyncio.Event()
+    
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                state["received"] += 1
+                if state["frame"] is not None:
+                    # The previous frame was never started; replace it with the newer one
+                    state["dropped"] += 1
+                state["frame"] = message["bytes"]
+                state["sequence"] = state["received"]
+                state["received_at"] = time.perf_counter()
+                frame_ready.set()
+            elif message.get("text"):
+                try:
+                    state["language"] = Language(message["text"].strip())
+                except ValueError:
+                    await websocket.send_json({"error": f"Unknown language '{message['text'].strip()}'"})
+    
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            waiter = asyncio.create_task(frame_ready.wait())
+            done, _ = await asyncio.wait({receiver, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                waiter.cancel()
+                break
+            
+            frame_ready.clear()
+            data, sequence, received_at = state["frame"], state["sequence"], state["received_at"]
+            state["frame"] = None
+            
+            timings: Dict[str, float] = {}
+            with timed_stage(timings, "decode"):
+                image = await run_in_threadpool(decode_image_bytes, data)
+            if image is None:
+                await websocket.send_json({"frame": sequence, "error": "Could not read image"})
+                continue
+            frame_id = uuid.uuid4().hex
             try:
-                os.unlink(temp_file)
-                logger.info(f"Removed temporary file: {temp_file}")
-            except Exception as e:
-                logger.warning(f"Failed to remove temporary file {temp_file}: {str(e)}")
+                result = await detect_decoded_image(image, frame_id)
+            except HTTPException as e:
+                await websocket.send_json({"frame": sequence, "error": e.detail})
+                continue
+            merge_timings(timings, result.pop("timings", None))
+            await run_in_threadpool(keep_crop_source, frame_id, data, result["detections"])
+            
+            with timed_stage(timings, "meaning_lookup"):
+                result = add_meanings(result, state["language"])
+            result.update({
+                "frame": sequence,
+                "latency_ms": (time.perf_counter() - received_at) * 1000,
+                "frames_received": state["received"],
+                "frames_dropped": state["dropped"],
+            })
+            with timed_stage(timings, "serialization"):
+                await websocket.send_json(result)
+            metrics.observe_timings(timings)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        try:
+            await receiver
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            pass
+        except Exception as e:
+            logger.warning(f"Stream receiver failed: {e}")
+        active_streams -= 1
+        logger.info(f"Stream closed after {state['received']} frames ({state['dropped']} dropped)")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Get detection result cache hit/miss/eviction counters"""
+    if detection_cache is None:
+        return {"enabled": False}
+    return detection_cache.stats()
+
+@app.delete("/cache")
+async def clear_cache():
+    """Drop every cached detection result (e.g. after replacing the model weights)"""
+    if detection_cache is None:
+        return {"enabled": False, "cleared": False}
+    detection_cache.invalidate()
+    return {"enabled": True, "cleared": True}
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Get micro-batching queue depth and batch-size statistics"""
+    if scheduler is None:
+        return {
+            "enabled": False,
+            "window_ms": MICROBATCH_WINDOW_MS,
+            "max_batch_size": MICROBATCH_MAX_SIZE,
+        }
+    return scheduler.stats()
 
 @app.get("/meanings/{ornament_name}")
 async def get_meaning(ornament_name: str, language: Language = Language.ENGLISH):
@@ -608,13 +3639,13 @@ async def debug():
         
         # Get available meanings
         try:
-            if len(meanings_df) > 0:
-                meanings_info["count"] = len(meanings_df)
-                meanings_info["names"] = meanings_df["name"].tolist()
+            if len(meanings_index) > 0:
+                meanings_info["count"] = len(meanings_index)
+                meanings_info["names"] = list(meanings_index.names)
                 
                 # Show a sample of meanings
                 sample = {}
-                for name in meanings_df["name"].tolist()[:3]:  # Show first 3
+                for name in meanings_index.names[:3]:  # Show first 3
                     sample[name] = {
                         "en": get_ornament_meaning(name, "en"),
                         "kg": get_ornament_meaning(name, "kg"),
@@ -628,12 +3659,18 @@ async def debug():
             meanings_info["error_type"] = str(type(e))
             meanings_info["traceback"] = traceback.format_exc().split("\n")
         
+        # Read from the installed package metadata, so this works before ultralytics is imported
+        try:
+            ultralytics_version = metadata.version("ultralytics")
+        except metadata.PackageNotFoundError:
+            ultralytics_version = "unknown"
+        
         return {
             "model": model_info,
             "meanings": meanings_info,
             "working_directory": os.getcwd(),
             "python_version": sys.version,
-            "ultralytics_version": YOLO.__version__ if hasattr(YOLO, '__version__') else "unknown"
+            "ultralytics_version": ultralytics_version
         }
     except Exception as e:
         logger.error(f"Error in debug endpoint: {str(e)}")
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Persistent catalog of the trained .pt weights and exported models in the project.
+
+Metadata (size, content hash, class names, input size, parameter count) is extracted once per file and
+kept in a JSON index; later refreshes only re-read files whose size or mtime changed, and reuse the listing
+of directories whose mtime didn't change. The API records the latency it measures when it loads a model.
+
+    python model_catalog.py                       # refresh and list everything
+    python model_catalog.py --kind pt --sort latency
+    python model_catalog.py --names ../training/runs/detect/yolov8_custom/weights/best.pt
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+from typing import Any, Dict, List, Optional
+
+CATALOG_VERSION = 1
+DEFAULT_CATALOG_PATH = os.getenv("MODEL_CATALOG_PATH", "model_catalog.json")
+
+# Directory suffix of OpenVINO exports, which are catalogued as one artifact
+OPENVINO_SUFFIX = "_openvino_model"
+ARTIFACT_KINDS = {".pt": "pt", ".onnx": "onnx", ".torchscript": "torchscript"}
+
+# Never worth descending into: version control, environments, caches and API output
+SKIP_DIRS = {".git", "__pycache__", "node_modules", ".venv", "venv", "model_cache", "uploads", "crop_sources",
+             "profiles"}
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def artifact_kind(path: str, is_dir: bool) -> Optional[str]:
+    if is_dir:
+        return "openvino" if path.endswith(OPENVINO_SUFFIX) else None
+    return ARTIFACT_KINDS.get(os.path.splitext(path)[1].lower())
+
+def artifact_files(path: str, kind: str) -> List[str]:
+    """The files whose contents make up an artifact (an OpenVINO export is a directory)"""
+    if kind != "openvino":
+        return [path]
+    return sorted(os.path.join(path, name) for name in os.listdir(path)
+                  if os.path.isfile(os.path.join(path, name)))
+
+def _normalize_names(names) -> Optional[Dict[str, str]]:
+    if names is None:
+        return None
+    if isinstance(names, str):
+        names = ast.literal_eval(names)
+    if isinstance(names, (list, tuple)):
+        names = dict(enumerate(names))
+    return {str(index): str(name) for index, name in names.items()}
+
+def _normalize_imgsz(imgsz) -> Optional[List[int]]:
+    if imgsz is None:
+        return None
+    if isinstance(imgsz, str):
+        imgsz = ast.literal_eval(imgsz)
+    if isinstance(imgsz, int):
+        return [imgsz, imgsz]
+    return [int(size) for size in imgsz]
+
+def _pt_metadata(path: str) -> Dict[str, Any]:
+    """Read an ultralytics checkpoint without building a YOLO model (or running the predictor setup)"""
+    import torch
+    checkpoint = torch.load(path, map_location="cpu", weights_only=False)
+    if not isinstance(checkpoint, dict):
+        raise ValueError("not an ultralytics checkpoint")
+    network = checkpoint.get("ema") or checkpoint.get("model")
+    train_args = checkpoint.get("train_args") or {}
+    model_args = getattr(network, "args", None) or {}
+    if not isinstance(model_args, dict):
+        model_args = vars(model_args)
+    return {
+        "names": _normalize_names(getattr(network, "names", None)),
+        "imgsz": _normalize_imgsz(train_args.get("imgsz") or model_args.get("imgsz")),
+        "parameters": sum(parameter.numel() for parameter in network.parameters()) if network is not None else None,
+        "task": train_args.get("task") or getattr(network, "task", None),
+        "trained_at": checkpoint.get("date"),
+        "epoch": checkpoint.get("epoch"),
+        "ultralytics_version": checkpoint.get("version"),
+    }
+
+def _export_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Catalog fields from the metadata ultralytics embeds in exported models"""
+    return {
+        "names": _normalize_names(metadata.get("names")),
+        "imgsz": _normalize_imgsz(metadata.get("imgsz")),
+        "task": metadata.get("task"),
+        "trained_at": metadata.get("date"),
+        "ultralytics_version": metadata.get("version"),
+    }
+
+def _onnx_metadata(path: str) -> Dict[str, Any]:
+    import onnx
+    model_proto = onnx.load(path, load_external_data=False)
+    fields = _export_metadata({prop.key: prop.value for prop in model_proto.metadata_props})
+    parameters = 0
+    for initializer in model_proto.graph.initializer:
+        count = 1
+        for dim in initializer.dims:
+            count *= dim
+        parameters += count
+    fields["parameters"] = parameters
+    return fields
+
+def _torchscript_metadata(path: str) -> Dict[str, Any]:
+    # TorchScript files are zip archives; ultralytics stores its metadata as extra/config.txt
+    with zipfile.ZipFile(path) as archive:
+        config = next((name for name in archive.namelist() if name.endswith("/extra/config.txt")), None)
+        return _export_metadata(json.loads(archive.read(config)) if config else {})
+
+def _openvino_metadata(path: str) -> Dict[str, Any]:
+    import yaml
+    metadata_path = os.path.join(path, "metadata.yaml")
+    if not os.path.exists(metadata_path):
+        return {}
+    with open(metadata_path) as f:
+        return _export_metadata(yaml.safe_load(f) or {})
+
+METADATA_READERS = {
+    "pt": _pt_metadata,
+    "onnx": _onnx_metadata,
+    "torchscript": _torchscript_metadata,
+    "openvino": _openvino_metadata,
+}
+
+class ModelCatalog:
+    """JSON-backed index of model artifacts under one or more root directories"""
+
+    def __init__(self, path: str = DEFAULT_CATALOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Only one refresh walks the disk at a time; the API may refresh while a model load records latency
+        self._refresh_lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # directory -> mtime and listing from the last scan
+        self._dirs: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CATALOG_VERSION:
+            self._entries = data.get("entries", {})
+            self._dirs = data.get("dirs", {})
+
+    def save(self):
+        with self._lock:
+            data = {"version": CATALOG_VERSION, "entries": self._entries, "dirs": self._dirs}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            # Written to a temporary file and renamed, so API workers and the CLI never see a partial index
+            temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(data, f, indent=1)
+            os.replace(temp_path, self.path)
+
+    def _list_dir(self, directory: str) -> Dict[str, Any]:
+        """Subdirectories and artifacts of a directory, reusing the last listing while its mtime is unchanged"""
+        mtime_ns = os.stat(directory).st_mtime_ns
+        cached = self._dirs.get(directory)
+        if cached is not None and cached["mtime_ns"] == mtime_ns:
+            return cached
+
+        subdirs, artifacts = [], []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if artifact_kind(entry.name, is_dir):
+                    artifacts.append(entry.name)
+                elif is_dir and entry.name not in SKIP_DIRS and not entry.name.startswith("."):
+                    subdirs.append(entry.name)
+        listing = {"mtime_ns": mtime_ns, "subdirs": sorted(subdirs), "artifacts": sorted(artifacts)}
+        with self._lock:
+            self._dirs[directory] = listing
+        return listing
+
+    def _discover(self, root: str) -> List[str]:
+        found = []
+        pending = [os.path.abspath(root)]
+        while pending:
+            directory = pending.pop()
+            try:
+                listing = self._list_dir(directory)
+            except OSError:
+                with self._lock:
+                    self._dirs.pop(directory, None)
+                continue
+            found.extend(os.path.join(directory, name) for name in listing["artifacts"])
+            pending.extend(os.path.join(directory, name) for name in listing["subdirs"])
+        return found
+
+    def _describe(self, path: str, kind: str, size: int, mtime_ns: int) -> Dict[str, Any]:
+        """Extract an artifact's metadata; reading problems are recorded instead of raised"""
+        entry = {
+            "path": path, "kind": kind, "size": size, "mtime_ns": mtime_ns, "sha256": None,
+            "names": None, "imgsz": None, "parameters": None, "task": None, "trained_at": None,
+            "epoch": None, "ultralytics_version": None, "error": None,
+            "latency_ms": None, "latency_measured_at": None, "scanned_at": time.time(),
+        }
+        try:
+            if kind == "openvino":
+                digest = hashlib.sha256()
+                for file_path in artifact_files(path, kind):
+                    digest.update(file_sha256(file_path).encode())
+                entry["sha256"] = digest.hexdigest()
+            else:
+                entry["sha256"] = file_sha256(path)
+            entry.update(METADATA_READERS[kind](path))
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {str(e)}"
+        return entry
+
+    def _stat(self, path: str, kind: str):
+        if kind != "openvino":
+            stat = os.stat(path)
+            return stat.st_size, stat.st_mtime_ns
+        stats = [os.stat(file_path) for file_path in artifact_files(path, kind)]
+        return sum(stat.st_size for stat in stats), max((stat.st_mtime_ns for stat in stats), default=0)
+
+    def refresh(self, roots: List[str]) -> Dict[str, int]:
+        """Bring the index up to date with the artifacts under roots, re-reading only changed files"""
+        with self._refresh_lock:
+            return self._refresh(roots)
+
+    def _refresh(self, roots: List[str]) -> Dict[str, int]:
+        counts = {"unchanged": 0, "scanned": 0, "removed": 0}
+        seen = set()
+        for root in roots:
+            for path in self._discover(root):
+                kind = artifact_kind(path, os.path.isdir(path))
+                try:
+                    size, mtime_ns = self._stat(path, kind)
+                except OSError:
+                    continue
+                seen.add(path)
+                with self._lock:
+                    entry = self._entries.get(path)
+                if entry is not None and entry["size"] == size and entry["mtime_ns"] == mtime_ns:
+                    counts["unchanged"] += 1
+                    continue
+
+                described = self._describe(path, kind, size, mtime_ns)
+                if entry is not None and entry.get("sha256") == described["sha256"]:
+                    # Touched but identical; the measured latency still applies
+                    described["latency_ms"] = entry.get("latency_ms")
+                    described["latency_measured_at"] = entry.get("latency_measured_at")
+                with self._lock:
+                    self._entries[path] = described
+                counts["scanned"] += 1
+
+        roots = [os.path.abspath(root) for root in roots]
+        with self._lock:
+            for path in list(self._entries):
+                under_root = any(path == root or path.startswith(root + os.sep) for root in roots)
+                if under_root and path not in seen:
+                    del self._entries[path]
+                    counts["removed"] += 1
+        return counts
+
+    def record_latency(self, path: str, latency_ms: float):
+        """Store the latency measured for an artifact (only if it is already catalogued)"""
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            if entry is None:
+                return False
+            entry["latency_ms"] = latency_ms
+            entry["latency_measured_at"] = time.time()
+        self.save()
+        return True
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            return dict(entry) if entry is not None else None
+
+    def query(self, kind: Optional[str] = None, has_class: Optional[str] = None,
+              sort: str = "mtime") -> List[Dict[str, Any]]:
+        """Catalogued artifacts, optionally of one kind or detecting a given class name"""
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries.values()]
+        if kind:
+            entries = [entry for entry in entries if entry["kind"] == kind]
+        if has_class:
+            wanted = has_class.lower()
+            entries = [entry for entry in entries
+                       if any(name.lower() == wanted for name in (entry["names"] or {}).values())]
+
+        sort_keys = {
+            "mtime": lambda entry: -entry["mtime_ns"],
+            "size": lambda entry: -entry["size"],
+            "path": lambda entry: entry["path"],
+            # Unmeasured artifacts go last
+            "latency": lambda entry: (entry["latency_ms"] is None, entry["latency_ms"] or 0.0),
+        }
+        return sorted(entries, key=sort_keys[sort])
+
+def measure_latency(path: str, runs: int = 5, imgsz: int = 640) -> float:
+    """Median latency in ms of one forward pass on a blank image (loads the model, so it isn't cheap)"""
+    import numpy as np
+    from ultralytics import YOLO
+    model = YOLO(path, task="detect")
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    model(dummy, imgsz=imgsz, verbose=False)  # warm-up
+    timings = []
+    for _ in range(max(1, runs)):
+        started = time.perf_counter()
+        model(dummy, imgsz=imgsz, verbose=False)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+def print_table(entries: List[Dict[str, Any]], root: str):
+    print(f"{'#':>3}  {'kind':<11} {'size MB':>8} {'classes':>7} {'imgsz':>9} {'params':>8} {'latency':>9}  path")
+    for index, entry in enumerate(entries, start=1):
+        names = entry["names"] or {}
+        imgsz = "x".join(str(size) for size in entry["imgsz"]) if entry["imgsz"] else "-"
+        parameters = f"{entry['parameters'] / 1e6:.2f}M" if entry["parameters"] else "-"
+        latency = f"{entry['latency_ms']:.1f} ms" if entry["latency_ms"] is not None else "-"
+        path = os.path.relpath(entry["path"], root)
+        if entry["error"]:
+            path += f"  ({entry['error']})"
+        print(f"{index:>3}  {entry['kind']:<11} {entry['size'] / (1024 * 1024):>8.2f} {len(names):>7} {imgsz:>9} "
+              f"{parameters:>8} {latency:>9}  {path}")
+
+def main():
+    default_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    parser = argparse.ArgumentParser(description="List and query the model artifacts in the project")
+    parser.add_argument("--root", action="append", help=f"Directory to scan (repeatable). Default: {default_root}")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH, help="Index file")
+    parser.add_argument("--no-refresh", action="store_true", help="Query the index without looking at the disk")
+    parser.add_argument("--kind", choices=sorted(METADATA_READERS), help="Only list one kind of artifact")
+    parser.add_argument("--has-class", help="Only list models that detect this class name")
+    parser.add_argument("--sort", default="mtime", choices=("mtime", "size", "path", "latency"))
+    parser.add_argument("--measure", action="store_true", help="Measure the latency of the listed models")
+    parser.add_argument("--names", metavar="PATH", help="Print the class names of one model")
+    parser.add_argument("--json", action="store_true", help="Print entries as JSON")
+    args = parser.parse_args()
+
+    roots = args.root or [default_root]
+    catalog = ModelCatalog(args.catalog)
+    if not args.no_refresh:
+        started = time.perf_counter()
+        counts = catalog.refresh(roots)
+        catalog.save()
+        print(f"Catalog refreshed in {(time.perf_counter() - started) * 1000:.0f} ms "
+              f"({counts['scanned']} read, {counts['unchanged']} unchanged, {counts['removed']} removed)",
+              file=sys.stderr)
+
+    if args.names:
+        entry = catalog.get(args.names)
+        if entry is None or entry["names"] is None:
+            print(f"No class names catalogued for {args.names}", file=sys.stderr)
+            return 1
+        for index, name in entry["names"].items():
+            print(f"  {index}: '{name}'")
+        return 0
+
+    entries = catalog.query(args.kind, args.has_class, args.sort)
+    if args.measure:
+        for entry in entries:
+            if entry["error"] is None:
+                latency = measure_latency(entry["path"])
+                catalog.record_latency(entry["path"], latency)
+                entry["latency_ms"] = latency
+
+    if args.json:
+        print(json.dumps(entries, indent=2))
+    else:
+        print_table(entries, roots[0])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
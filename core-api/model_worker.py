@@ -0,0 +1,71 @@
+"""
+Model-worker process loop for main.ModelWorkerPool.
+
+Workers are started with the "spawn" context and load their own copy of the serving model. Forking the
+API process instead is unsafe: once torch has run parallel work with more than one thread, a forked child
+deadlocks in its first forward pass. This module is kept free of the API's imports so spawning is cheap.
+"""
+
+import queue
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Tuple
+
+import numpy as np
+
+def result_arrays(r) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Copy the boxes of one YOLO result into plain (xyxy, conf, cls) NumPy arrays"""
+    boxes = r.boxes
+    return boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy()
+
+def close_shared_blocks(blocks: List[SharedMemory]) -> List[SharedMemory]:
+    """Close shared memory blocks, returning the ones still referenced by live array views"""
+    still_open = []
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            still_open.append(block)
+    return still_open
+
+def model_worker_main(task_queue, result_queue, model_path: str, imgsz: int, max_batch: int, torch_threads: int,
+                      generation: int, current_generation):
+    """Model worker loop: read frames from shared memory, run the model, send back box arrays
+
+    Tasks are run max_batch images at a time (1 for exports with a fixed batch size). The worker exits once current_generation moves past its own (the pool started replacements with a new model).
+    """
+    import torch
+    torch.set_num_threads(torch_threads)
+    from ultralytics import YOLO
+    model = YOLO(model_path, task="detect")
+    lingering: List[SharedMemory] = []
+
+    while current_generation.value == generation:
+        try:
+            task = task_queue.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        if task is None:
+            break
+
+        task_id, frames = task
+        blocks = []
+        try:
+            images = []
+            for name, shape in frames:
+                # Spawned children share the parent's resource tracker, so attaching only re-registers a name the
+                # parent already tracks, and the parent's unlink unregisters it once
+                block = SharedMemory(name=name)
+                blocks.append(block)
+                images.append(np.ndarray(shape, dtype=np.uint8, buffer=block.buf))
+
+            outputs = []
+            for start in range(0, len(images), max_batch):
+                results = model(images[start:start + max_batch], imgsz=imgsz, verbose=False)
+                outputs.extend(result_arrays(r) for r in results)
+                del results
+            del images
+            result_queue.put((task_id, outputs, None))
+        except Exception as e:
+            result_queue.put((task_id, None, f"{type(e).__name__}: {str(e)}"))
+        finally:
+            lingering = close_shared_blocks(lingering + blocks)
@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 
-from ultralytics import YOLO
 import os
 
+from model_catalog import ModelCatalog
+
 def main():
     # Try both local and original path
     model_paths = [
@@ -10,26 +11,30 @@ def main():
         "../training/runs/detect/yolov8_custom/weights/best.pt"  # Original path
     ]
     
-    model = None
+    # The class names come from the model catalog, which reads each checkpoint once instead of building a model
+    catalog = ModelCatalog()
+    names = None
     for path in model_paths:
         if os.path.exists(path):
             print(f"Found model at: {path}")
-            try:
-                model = YOLO(path)
+            catalog.refresh([os.path.dirname(os.path.abspath(path))])
+            catalog.save()
+            entry = catalog.get(path)
+            if entry is not None and entry["names"] is not None:
+                names = entry["names"]
                 break
-            except Exception as e:
-                print(f"Error loading model from {path}: {e}")
+            print(f"Error loading model from {path}: {entry['error'] if entry else 'not catalogued'}")
     
-    if model is None:
+    if names is None:
         print("Could not load model from any path")
         return
     
     print("\nModel class names:")
-    for idx, name in model.names.items():
+    for idx, name in names.items():
         print(f"  {idx}: '{name}'")
     
     print("\nAdd these entries to meanings.csv:")
-    for idx, name in model.names.items():
+    for idx, name in names.items():
         print(f"{name},\"Meaning in Kyrgyz for {name}\",\"Meaning in Russian for {name}\",\"Meaning in English for {name}\"")
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Preload-and-fork server: load and warm up the model once, then fork uvicorn workers from this process.
+
+With `uvicorn main:app --workers N` every worker imports main.py and loads its own copy of the model.
+Here the workers inherit the parent's memory, so the model weights are shared copy-on-write and each
+extra worker costs little more than its own Python heap. Each worker gets an equal share of the CPUs
+for torch, and a worker that dies is re-forked from the parent without loading the model again.
+
+    SERVER_WORKERS=4 python serve.py --port 8000
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger("serve")
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Listening socket shared by all workers; the kernel spreads connections between them"""
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(api, sock: socket.socket, index: int, workers: int, log_level: str):
+    """Body of a forked worker: serve the already-loaded app on the shared socket until told to stop"""
+    import uvicorn
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    api.model_state["torch_threads"] = api.configure_torch_threads(workers)
+    logger.info(f"Worker {index} (pid {os.getpid()}) serving with {api.model_state['torch_threads']} torch threads")
+    config = uvicorn.Config(api.app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+class Supervisor:
+    """Forks the workers, re-forks any that die and passes shutdown signals on to them"""
+
+    def __init__(self, api, sock: socket.socket, workers: int, log_level: str):
+        self.api = api
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.children = {}  # pid -> worker index
+        self.stopping = False
+        self.restarts = 0
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.api, self.sock, index, self.workers, self.log_level)
+            except Exception:
+                logger.exception(f"Worker {index} crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = index
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> int:
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for index in range(self.workers):
+            self.spawn(index)
+        logger.info(f"Serving with {self.workers} workers forked from pid {os.getpid()}")
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            logger.error(f"Worker {index} (pid {pid}) exited with status {status}, forking a replacement")
+            self.restarts += 1
+            time.sleep(1)  # don't spin if workers die straight away
+            self.spawn(index)
+        return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from workers forked after the model is loaded")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVER_WORKERS", "2")))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    # main.py reads these at import: load the model right away, and split the CPUs between the workers
+    os.environ["MODEL_LOAD"] = "blocking"
+    os.environ["SERVER_WORKERS"] = str(workers)
+
+    started = time.perf_counter()
+    import main as api
+    logger.info(f"Model preloaded in {time.perf_counter() - started:.1f}s ({api.model_state['state']})")
+
+    sock = bind_socket(args.host, args.port)
+    # Move everything allocated so far out of the collector's reach, so a collection in a worker
+    # doesn't write to (and so copy) the pages of objects it shares with the parent
+    gc.collect()
+    gc.freeze()
+    return Supervisor(api, sock, workers, args.log_level).run()
+
+if __name__ == "__main__":
+    sys.exit(main())
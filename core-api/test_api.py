@@ -1,8 +1,18 @@
 import requests
 import argparse
 import os
+import sys
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+DEFAULT_DATASET = Path(__file__).resolve().parent.parent / "Dataset"
+LOAD_ENDPOINTS = ("detect", "meanings", "batch")
+
 def test_detect_ornaments(image_path, language="en", url="http://localhost:8000"):
     """Test the detect ornaments endpoint with a local image"""
     if not os.path.exists(image_path):
@@ -61,6 +71,237 @@ def test_get_meaning(ornament_name, language="en", url="http://localhost:8000"):
     except Exception as e:
         print(f"Error making API request: {str(e)}")
 
+def load_dataset(dataset_dir, max_images=200):
+    """Read up to max_images images from Dataset/<ornament>/ into memory, with the ornament names"""
+    paths = sorted(path for path in Path(dataset_dir).rglob("*") if path.suffix.lower() in IMAGE_EXTENSIONS)
+    images = [(path.name, path.read_bytes()) for path in paths[:max_images]]
+    ornaments = sorted({path.parent.name for path in paths if path.parent != Path(dataset_dir)})
+    return images, ornaments
+
+def parse_endpoint_mix(spec):
+    """Parse "detect:8,meanings:2,batch:1" (weights default to 1) into {endpoint: weight}"""
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.strip().partition(":")
+        if name not in LOAD_ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}', expected one of {', '.join(LOAD_ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+class LoadTest:
+    """Drives the API with a weighted mix of /detect/, /meanings/{name} and /detect/batch requests"""
+    
+    def __init__(self, url, images, ornaments, mix, language="en", batch_size=4, cache_bust=True, seed=0):
+        if not images and ({"detect", "batch"} & set(mix)):
+            raise ValueError("No images found for the detect/batch endpoints")
+        if not ornaments and "meanings" in mix:
+            raise ValueError("No ornament folders found for the meanings endpoint")
+        self.url = url.rstrip("/")
+        self.images = images
+        self.ornaments = ornaments
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.language = language
+        self.batch_size = batch_size
+        self.cache_bust = cache_bust
+        self._random = random.Random(seed)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.samples = []  # (endpoint, status code or None, latency seconds)
+    
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+    
+    def _image(self):
+        with self._lock:
+            name, data = self._random.choice(self.images)
+        if self.cache_bust:
+            # Bytes after the JPEG end marker are ignored by decoders but defeat the server's result cache
+            data = data + os.urandom(16)
+        return name, data
+    
+    def _send(self, endpoint):
+        session = self._session()
+        if endpoint == "detect":
+            name, data = self._image()
+            return session.post(f"{self.url}/detect/", files={"file": (name, data, "image/jpeg")},
+                                data={"language": self.language}, timeout=120)
+        if endpoint == "batch":
+            files = [("files", (name, data, "image/jpeg")) for name, data in
+                     (self._image() for _ in range(self.batch_size))]
+            return session.post(f"{self.url}/detect/batch", files=files,
+                                data={"language": self.language}, timeout=300)
+        with self._lock:
+            ornament = self._random.choice(self.ornaments)
+        return session.get(f"{self.url}/meanings/{ornament}", params={"language": self.language}, timeout=30)
+    
+    def run_one(self, scheduled_at=None):
+        """Send one request; with a fixed arrival rate, latency counts from when it was due to be sent"""
+        with self._lock:
+            endpoint = self._random.choices(self.endpoints, self.weights)[0]
+        started = scheduled_at if scheduled_at is not None else time.perf_counter()
+        try:
+            status = self._send(endpoint).status_code
+        except requests.RequestException:
+            status = None
+        latency = time.perf_counter() - started
+        with self._lock:
+            self.samples.append((endpoint, status, latency))
+    
+    def run_closed_loop(self, concurrency, duration):
+        """Keep `concurrency` requests in flight until `duration` seconds have passed"""
+        deadline = time.perf_counter() + duration
+        
+        def worker():
+            while time.perf_counter() < deadline:
+                self.run_one()
+        
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    def run_fixed_rate(self, rate, duration, max_in_flight=256):
+        """Start `rate` requests per second regardless of how fast the server answers (open loop)"""
+        interval = 1.0 / rate
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            sent = 0
+            while True:
+                scheduled_at = started + sent * interval
+                if scheduled_at - started >= duration:
+                    break
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.run_one, scheduled_at)
+                sent += 1
+    
+    def summary(self, elapsed):
+        """Throughput, error rate (connection failures and 5xx) and latency percentiles per endpoint and overall"""
+        def summarize(samples):
+            latencies = sorted(latency * 1000 for _, _, latency in samples)
+            errors = sum(1 for _, status, _ in samples if status is None or status >= 500)
+            status_codes = {}
+            for _, status, _ in samples:
+                key = str(status) if status is not None else "connection_error"
+                status_codes[key] = status_codes.get(key, 0) + 1
+            return {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": errors / len(samples) if samples else 0.0,
+                "throughput_rps": len(samples) / elapsed if elapsed > 0 else 0.0,
+                "latency_ms": {
+                    "mean": sum(latencies) / len(latencies) if latencies else None,
+                    "p50": percentile(latencies, 0.50),
+                    "p95": percentile(latencies, 0.95),
+                    "p99": percentile(latencies, 0.99),
+                    "max": latencies[-1] if latencies else None,
+                },
+                "status_codes": status_codes,
+            }
+        
+        endpoints = {name: summarize([sample for sample in self.samples if sample[0] == name])
+                     for name in self.endpoints}
+        return {"overall": summarize(self.samples), "endpoints": endpoints}
+
+def compare_to_baseline(results, baseline, max_regression):
+    """List regressions: p95 latency or throughput worse by more than max_regression (a fraction),
+    or error rate higher by more than max_regression percentage points"""
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous or not previous["requests"] or not current["requests"]:
+            continue
+        old_p95, new_p95 = previous["latency_ms"]["p95"], current["latency_ms"]["p95"]
+        if old_p95 and new_p95 > old_p95 * (1 + max_regression):
+            regressions.append(f"{name}: p95 latency {old_p95:.1f} ms -> {new_p95:.1f} ms")
+        old_rps, new_rps = previous["throughput_rps"], current["throughput_rps"]
+        if old_rps and new_rps < old_rps * (1 - max_regression):
+            regressions.append(f"{name}: throughput {old_rps:.2f} -> {new_rps:.2f} req/s")
+        if current["error_rate"] > previous["error_rate"] + max_regression:
+            regressions.append(f"{name}: error rate {previous['error_rate']:.1%} -> {current['error_rate']:.1%}")
+    return regressions
+
+def print_load_summary(results):
+    print(f"\n--- Load Test Results ({results['config']['mode']}, {results['elapsed_seconds']:.1f}s) ---")
+    print(f"{'endpoint':<10} {'requests':>9} {'rps':>8} {'errors':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(results["endpoints"].items()) + [("overall", results["overall"])]
+    for name, summary in rows:
+        latency = summary["latency_ms"]
+        def fmt(value):
+            return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+        print(f"{name:<10} {summary['requests']:>9} {summary['throughput_rps']:>8.2f} "
+              f"{summary['error_rate']:>8.1%} {fmt(latency['p50'])} {fmt(latency['p95'])} {fmt(latency['p99'])}")
+
+def run_load_test(args):
+    """Run a load test from parsed CLI arguments; returns the process exit code"""
+    try:
+        mix = parse_endpoint_mix(args.endpoints)
+        images, ornaments = load_dataset(args.dataset, args.max_images)
+        test = LoadTest(args.url, images, ornaments, mix, args.language, args.batch_size,
+                        not args.no_cache_bust, args.seed)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return 2
+    
+    mode = f"{args.rate} req/s" if args.rate else f"concurrency {args.concurrency}"
+    print(f"Load testing {args.url} for {args.duration}s at {mode} "
+          f"({len(images)} images, {len(ornaments)} ornaments, mix {args.endpoints})...")
+    started = time.perf_counter()
+    if args.rate:
+        test.run_fixed_rate(args.rate, args.duration, args.max_in_flight)
+    else:
+        test.run_closed_loop(args.concurrency, args.duration)
+    elapsed = time.perf_counter() - started
+    
+    results = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "url": args.url,
+        "elapsed_seconds": elapsed,
+        "config": {
+            "mode": mode,
+            "concurrency": None if args.rate else args.concurrency,
+            "rate": args.rate,
+            "duration": args.duration,
+            "endpoints": mix,
+            "batch_size": args.batch_size,
+            "images": len(images),
+            "cache_bust": not args.no_cache_bust,
+        },
+    }
+    results.update(test.summary(elapsed))
+    print_load_summary(results)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\nRegressions against {args.baseline} (threshold {args.max_regression:.0%}):")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"\nNo regressions against {args.baseline} (threshold {args.max_regression:.0%})")
+    return 0
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Test the Ornament Detection API")
     subparsers = parser.add_subparsers(dest="command", help="Command to run")
@@ -81,11 +322,37 @@ if __name__ == "__main__":
     meaning_parser.add_argument("--url", default="http://localhost:8000", 
                                 help="API base URL")
     
+    # Load test command
+    load_parser = subparsers.add_parser("load", help="Load test the API with images from Dataset/")
+    load_parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    load_parser.add_argument("--dataset", default=str(DEFAULT_DATASET), help="Image folders named by ornament")
+    load_parser.add_argument("--endpoints", default="detect",
+                             help="Weighted endpoint mix, e.g. detect:8,meanings:2,batch:1")
+    load_parser.add_argument("--concurrency", "-c", type=int, default=4,
+                             help="Requests kept in flight (closed loop)")
+    load_parser.add_argument("--rate", "-r", type=float, default=None,
+                             help="Fixed arrival rate in requests/second (open loop; overrides --concurrency)")
+    load_parser.add_argument("--max-in-flight", type=int, default=256,
+                             help="Cap on concurrent requests with --rate")
+    load_parser.add_argument("--duration", "-d", type=float, default=30, help="Test length in seconds")
+    load_parser.add_argument("--batch-size", type=int, default=4, help="Images per /detect/batch request")
+    load_parser.add_argument("--max-images", type=int, default=200, help="Images to load from the dataset")
+    load_parser.add_argument("--language", "-l", default="en", choices=["en", "kg", "ru"])
+    load_parser.add_argument("--no-cache-bust", action="store_true",
+                             help="Send identical image bytes, so repeats hit the server's result cache")
+    load_parser.add_argument("--seed", type=int, default=0, help="Random seed for image and endpoint choice")
+    load_parser.add_argument("--output", "-o", help="Write results as JSON to this file")
+    load_parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    load_parser.add_argument("--max-regression", type=float, default=0.10,
+                             help="Allowed fractional p95/throughput regression against the baseline")
+    
     args = parser.parse_args()
     
     if args.command == "detect":
         test_detect_ornaments(args.image_path, args.language, args.url)
     elif args.command == "meaning":
         test_get_meaning(args.ornament_name, args.language, args.url)
+    elif args.command == "load":
+        sys.exit(run_load_test(args))
     else:
         parser.print_help() 
\ No newline at end of file
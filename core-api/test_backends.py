@@ -0,0 +1,51 @@
+"""
+Regression test for exported backends: a model loaded from the model cache must still export and serve from
+next to MODEL_PATH (ultralytics used to write the export next to the cache artifact instead).
+
+    MODEL_PATH=models/best.pt python -m pytest -q test_backends.py
+"""
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+MODEL_PATH = os.getenv("MODEL_PATH", "models/best.pt")
+
+pytestmark = pytest.mark.skipif(not os.path.exists(MODEL_PATH), reason=f"no model at {MODEL_PATH}")
+
+def test_onnx_backend_after_model_cache_hit(tmp_path, monkeypatch):
+    pytest.importorskip("ultralytics")
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    import main
+
+    weights = str(tmp_path / "models" / "best.pt")
+    os.makedirs(os.path.dirname(weights))
+    shutil.copy(MODEL_PATH, weights)
+    cache_dir = str(tmp_path / "model_cache")
+    monkeypatch.setattr(main, "MODEL_PATH", weights)
+    monkeypatch.setattr(main, "MODEL_CACHE_DIR", cache_dir)
+    monkeypatch.setattr(main, "INFERENCE_BACKEND", "onnx")
+    monkeypatch.setattr(main, "BACKEND_BENCHMARK_RUNS", 0)
+    monkeypatch.setattr(main, "backend_info", {"name": None, "artifact": None, "latency_ms": None, "benchmarks": {}})
+
+    first, second = {}, {}
+    main.load_base_model(weights, first)
+    base_model = main.load_base_model(weights, second)
+    assert (first["cache"], second["cache"]) == ("miss", "hit")
+
+    serving = main.select_backend(base_model)
+    artifact = main.backend_info["artifact"]
+    assert main.backend_info["name"] == "onnx"
+    assert os.path.isfile(artifact) and os.path.dirname(artifact) == os.path.dirname(weights)
+    assert not [name for name in os.listdir(cache_dir) if name.endswith(".onnx")]
+
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    assert len(serving([image, image], imgsz=main.INFERENCE_IMGSZ, verbose=False)) == 2
+
+    # The next boot reuses the export instead of writing it again
+    exported_at = os.path.getmtime(artifact)
+    main.select_backend(main.load_base_model(weights, {}))
+    assert os.path.getmtime(artifact) == exported_at
@@ -0,0 +1,39 @@
+"""
+Regression test for the model-worker pool: a detection must come back when torch runs with more than one
+thread in the API process and in the workers (forked workers used to deadlock there).
+
+    MODEL_PATH=models/best.pt python -m pytest -q test_model_workers.py
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+MODEL_PATH = os.getenv("MODEL_PATH", "models/best.pt")
+
+pytestmark = pytest.mark.skipif(not os.path.exists(MODEL_PATH), reason=f"no model at {MODEL_PATH}")
+
+def test_pool_detects_with_multiple_torch_threads():
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("ultralytics")
+    import main
+
+    if main.model is None:
+        main.load_model()
+    assert main.model is not None
+    # Run multi-threaded inference in this process first, as the API does on a multi-core host
+    torch.set_num_threads(4)
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    main.model(image, imgsz=main.INFERENCE_IMGSZ, verbose=False)
+
+    pool = main.ModelWorkerPool(workers=1, torch_threads=2, timeout=120)
+    pool.start()
+    try:
+        outputs = pool.submit([image, image]).result(timeout=120)
+    finally:
+        pool.stop()
+
+    assert len(outputs) == 2
+    xyxy, conf, cls = outputs[0]
+    assert xyxy.shape[1:] == (4,) and len(conf) == len(cls) == len(xyxy)